@@ -7,7 +7,7 @@ Architecture:
   └─ Sub-Agents (on-demand):
      ├─ Image Manager Agent (3 tools)
      ├─ Catalog Manager Agent (2 tools)
-     └─ Try-On Specialist Agent (5 tools)
+     └─ Try-On Specialist Agent (6 tools)
 
 Workflow (User-Driven):
 1. User starts → Coordinator greets and explains
@@ -29,17 +29,20 @@ Benefits:
 - ✅ Unlimited iterations (user-controlled)
 """
 
+import asyncio
+import io
 import logging
 import os
 from typing import Optional
 from dotenv import load_dotenv
 from google.adk.agents import LlmAgent
 from google.adk.agents.callback_context import CallbackContext
-from google.adk.models import LlmRequest
-from google.adk.artifacts import InMemoryArtifactService
+from google.adk.models import Gemini, LlmRequest
 from google.adk.runners import Runner
 from google.adk.tools.load_artifacts_tool import load_artifacts_tool
-from google.genai.types import Content, Part
+from google.genai import types
+from google.genai.types import Blob, Content, Part
+from PIL import Image
 
 # Handle both relative and absolute imports for compatibility
 try:
@@ -52,15 +55,16 @@ try:
         get_rate_limit_status,
         generate_multiview_person,
         batch_multiview_tryon,
-        generate_video_from_results
-    )
-    from .tools.catalog_tool import list_catalog_clothes, select_catalog_cloth
-    from .prompts import (
-        IMAGE_MANAGER_INSTRUCTION,
-        CATALOG_MANAGER_INSTRUCTION,
-        TRYON_SPECIALIST_INSTRUCTION,
-        INTERACTIVE_COORDINATOR_INSTRUCTION
+        generate_video_from_results,
+        set_video_preference
     )
+    from .tools.catalog_tool import list_catalog_clothes, select_catalog_cloth, prefetch_catalog_listing
+    from .tools.background import artifact_task_key, track_task, flush_tasks
+    from .tools.handoff import update_handoff, format_handoff
+    from .tools.state_keys import LATEST_REFERENCE_IMAGE_KEY, REFERENCE_IMAGE_COUNT_KEY, REFERENCE_IMAGES_KEY
+    from .logging_config import configure_logging
+    from .artifact_service import FileBackedArtifactService
+    from .prompts import get_instruction, warm as warm_instructions
 except ImportError:
     # Fall back to absolute imports (for direct execution)
     from tools.tryon_tool import (
@@ -71,30 +75,72 @@ except ImportError:
         get_rate_limit_status,
         generate_multiview_person,
         batch_multiview_tryon,
-        generate_video_from_results
-    )
-    from tools.catalog_tool import list_catalog_clothes, select_catalog_cloth
-    from prompts import (
-        IMAGE_MANAGER_INSTRUCTION,
-        CATALOG_MANAGER_INSTRUCTION,
-        TRYON_SPECIALIST_INSTRUCTION,
-        INTERACTIVE_COORDINATOR_INSTRUCTION
+        generate_video_from_results,
+        set_video_preference
     )
+    from tools.catalog_tool import list_catalog_clothes, select_catalog_cloth, prefetch_catalog_listing
+    from tools.background import artifact_task_key, track_task, flush_tasks
+    from tools.handoff import update_handoff, format_handoff
+    from tools.state_keys import LATEST_REFERENCE_IMAGE_KEY, REFERENCE_IMAGE_COUNT_KEY, REFERENCE_IMAGES_KEY
+    from logging_config import configure_logging
+    from artifact_service import FileBackedArtifactService
+    from prompts import get_instruction, warm as warm_instructions
 
 # Load environment variables
 load_dotenv()
 
 # --- Configure Logging ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('virtual_tryon_agent.log', encoding='utf-8')
-    ]
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# Background warm-up work (catalog prefetch) started on upload
+_warmup_tasks: set = set()
+
+def _log_save_errors(task: asyncio.Task, filename: str, total: int) -> None:
+    """Done-callback for background artifact saves: log the result."""
+    if task.cancelled():
+        logger.warning("⚠️ [CALLBACK] Artifact save cancelled: %s", filename)
+        return
+    error = task.exception()
+    if error:
+        logger.error("❌ [CALLBACK] Error saving reference image artifact '%s': %s", filename, error)
+    else:
+        logger.info("[CALLBACK] saved %s v%s (total=%d)", filename, task.result(), total)
+
+def _transcode_to_webp(image_part: Part) -> Part:
+    """
+    Re-encode a PNG upload as lossy WebP (quality 85) to shrink the stored artifact.
+    
+    Other formats are already compressed and are stored unchanged. Falls back
+    to the original part if decoding fails or WebP would not be smaller.
+    """
+    blob = image_part.inline_data
+    if blob.mime_type != "image/png":
+        return image_part
+    
+    try:
+        with Image.open(io.BytesIO(blob.data)) as img:
+            buf = io.BytesIO()
+            img.save(buf, "WEBP", quality=85, method=4)
+    except Exception as e:
+        logger.warning("⚠️ [CALLBACK] WebP re-encode failed, storing original PNG: %s", e)
+        return image_part
+    
+    data = buf.getvalue()
+    if len(data) >= len(blob.data):
+        return image_part
+    return Part(inline_data=Blob(mime_type="image/webp", data=data))
+
+def _message_has_new_image(llm_request: LlmRequest) -> bool:
+    """
+    Cheap check for inline data on the latest message.
+    
+    Only looks for the presence of inline_data (no MIME parsing), so the
+    full scan in the callback is skipped on plain-text turns.
+    """
+    latest_parts = llm_request.contents[-1].parts or []
+    return any(getattr(p, "inline_data", None) for p in latest_parts)
+
 async def process_reference_images_callback(
     callback_context: CallbackContext, llm_request: LlmRequest
 ) -> Optional[Content]:
@@ -106,65 +152,124 @@ async def process_reference_images_callback(
     """
     if not llm_request.contents:
         return None
+    
+    state = callback_context.state
+    
+    # Fast path: image already on file and nothing new was attached this turn
+    if state.get(LATEST_REFERENCE_IMAGE_KEY) and not _message_has_new_image(llm_request):
+        return None
         
     latest_user_message = llm_request.contents[-1]
-    image_part = None
+    parts = latest_user_message.parts or []
     
     # Look for uploaded images in the latest user message
-    for part in latest_user_message.parts:
-        if part.inline_data and part.inline_data.mime_type.startswith("image/"):
-            logger.info(f"🖼️ [CALLBACK] Found reference image to process: {part.inline_data.mime_type}")
-            image_part = part
-            break
+    image_part = next(
+        (p for p in parts if getattr(p, "inline_data", None) and p.inline_data.mime_type[:6] == "image/"),
+        None
+    )
     
     # Process reference image if found
     if image_part:
+        logger.debug("[CALLBACK] Found reference image to process: %s", image_part.inline_data.mime_type)
+        
+        # Re-encode first (off the event loop): the filename extension
+        # follows the format actually stored
+        artifact = await asyncio.to_thread(_transcode_to_webp, image_part)
+        extension = "webp" if artifact is not image_part else "png"
+        
         # Generate versioned filename for reference image
-        reference_images = callback_context.state.get("reference_images", {})
-        ref_count = len(reference_images) + 1
-        filename = f"reference_image_v{ref_count}.png"
-        logger.info(f"💾 [CALLBACK] Saving reference image as artifact: {filename} (count: {ref_count})")
+        ref_count = state.get(REFERENCE_IMAGE_COUNT_KEY, 0) + 1
+        filename = f"reference_image_v{ref_count}.{extension}"
+        logger.debug("[CALLBACK] Saving reference image as artifact: %s (count: %d)", filename, ref_count)
         
+        # Update session state first so the next agent sees the filename
+        # without waiting on artifact storage
+        state[REFERENCE_IMAGE_COUNT_KEY] = ref_count
+        state[REFERENCE_IMAGES_KEY] = [*state.get(REFERENCE_IMAGES_KEY, []), filename]
+        state[LATEST_REFERENCE_IMAGE_KEY] = filename
+        update_handoff(state, person_image=filename, multiview_set=None)
+        
+        # Persist the artifact bytes in the background (load_image waits
+        # for this save if a tool asks for the file before it's done).
+        # Accepted limitation: the save usually finishes after this callback
+        # returns, so its artifact_delta entry may land on an event that was
+        # already emitted; the artifact itself is stored either way.
         try:
-            version = await callback_context.save_artifact(
-                filename=filename, artifact=image_part
-            )
-            
-            # Store reference image info in session state
-            if "reference_images" not in callback_context.state:
-                callback_context.state["reference_images"] = {}
+            task = track_task(artifact_task_key(callback_context, filename), asyncio.create_task(
+                callback_context.save_artifact(filename=filename, artifact=artifact)
+            ))
+            task.add_done_callback(lambda t, name=filename, n=ref_count: _log_save_errors(t, name, n))
             
-            callback_context.state["reference_images"][filename] = {
-                "version": ref_count,
-                "uploaded_version": version
-            }
-            callback_context.state["latest_reference_image"] = filename
+            logger.debug("[CALLBACK] Scheduled save of '%s' as artifact", filename)
             
-            logger.info(f"✅ [CALLBACK] Successfully saved '{filename}' as artifact version {version}")
-            logger.info(f"📊 [CALLBACK] Total reference images: {len(callback_context.state['reference_images'])}")
+            # Catalog listing is the next step and doesn't depend on the
+            # upload, so build it while the image is being validated
+            warmup = asyncio.create_task(asyncio.to_thread(prefetch_catalog_listing))
+            _warmup_tasks.add(warmup)
+            warmup.add_done_callback(_warmup_tasks.discard)
             
         except Exception as e:
-            logger.error(f"❌ [CALLBACK] Error saving reference image artifact: {e}", exc_info=True)
-    else:
+            logger.error("❌ [CALLBACK] Error saving reference image artifact: %s", e, exc_info=True)
+    elif logger.isEnabledFor(logging.DEBUG) and any(getattr(p, "text", None) for p in parts):
         # Log when no image found (for debugging)
-        has_text = any(hasattr(part, 'text') and part.text for part in latest_user_message.parts)
-        if has_text:
-            logger.debug(f"[CALLBACK] Text-only message, no image to process")
+        logger.debug("[CALLBACK] Text-only message, no image to process")
     
     # Don't return anything - let the original message go through
     return None
 
+def static_instruction(name: str, with_handoff: bool = False):
+    """
+    Build an ADK instruction provider for a named prompt from prompts.py.
+    
+    The text comes from the prompts cache, which is warmed at startup.
+    String instructions are scanned for {state_key} placeholders on every
+    LLM call. Our prompts contain no placeholders, and ADK skips the
+    state-injection pass for callable providers.
+    
+    With with_handoff=True, the current handoff state (working filenames)
+    is appended so sub-agents don't have to recover it from history. That
+    builds a new string each turn; only the cached prompt text is reused.
+    """
+    def provider(context) -> str:
+        text = get_instruction(name)
+        if with_handoff:
+            handoff = format_handoff(context.state)
+            if handoff:
+                text = f"{text}\n{handoff}\n"
+        return text
+    return provider
+
+# Per-request timeout for agent LLM calls, with one retry. A stuck Gemini
+# call would otherwise block the user-driven workflow indefinitely.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "15.0"))
+LLM_CONFIG = types.GenerateContentConfig(
+    http_options=types.HttpOptions(
+        timeout=int(LLM_TIMEOUT_SECONDS * 1000),  # milliseconds
+        retry_options=types.HttpRetryOptions(attempts=2)
+    )
+)
+
+# Shared model instance: all agents reuse one Gemini wrapper, so its
+# underlying genai client (and HTTP connection pool) is created once
+FLASH_MODEL = Gemini(model="gemini-2.5-flash")
+
 # ========================================
 # SPECIALIZED AGENTS
 # ========================================
 
+# Note: process_reference_images_callback is registered on every agent. The
+# runner sends the user's next message to whichever agent replied last, so
+# an upload can arrive at any of them; turns without a new image return
+# early via _message_has_new_image.
+
 # 1. Image Management Agent (Step 1: Person Image Upload)
 # Handles: Image uploads, validation, listing, clearing
 # Output: latest_reference_image stored in state
 image_manager_agent = LlmAgent(
     name="image_manager_agent",
-    model="gemini-2.5-flash",
-    instruction=IMAGE_MANAGER_INSTRUCTION,
+    model=FLASH_MODEL,
+    generate_content_config=LLM_CONFIG,
+    instruction=static_instruction("IMAGE_MANAGER_INSTRUCTION", with_handoff=True),
     description="Step 1: Manages person image uploads and validation",
     tools=[
         list_reference_images,
@@ -172,7 +277,7 @@ image_manager_agent = LlmAgent(
         load_artifacts_tool,
         generate_multiview_person
     ],
-    output_key="latest_reference_image",  # Pass image filename to next agent
+    output_key=LATEST_REFERENCE_IMAGE_KEY,  # Pass image filename to next agent
     before_model_callback=process_reference_images_callback
 )
 
@@ -182,8 +287,9 @@ image_manager_agent = LlmAgent(
 # Output: selected_garment stored in state
 catalog_manager_agent = LlmAgent(
     name="catalog_manager_agent",
-    model="gemini-2.5-flash",
-    instruction=CATALOG_MANAGER_INSTRUCTION,
+    model=FLASH_MODEL,
+    generate_content_config=LLM_CONFIG,
+    instruction=static_instruction("CATALOG_MANAGER_INSTRUCTION", with_handoff=True),
     description="Step 2: Displays catalog and manages garment selection",
     tools=[
         list_catalog_clothes,
@@ -199,15 +305,17 @@ catalog_manager_agent = LlmAgent(
 # Output: tryon_result stored in state
 tryon_specialist_agent = LlmAgent(
     name="tryon_specialist_agent",
-    model="gemini-2.5-flash",
-    instruction=TRYON_SPECIALIST_INSTRUCTION,
+    model=FLASH_MODEL,
+    generate_content_config=LLM_CONFIG,
+    instruction=static_instruction("TRYON_SPECIALIST_INSTRUCTION", with_handoff=True),
     description="Step 3: Executes virtual try-on, manages results, and generates videos",
     tools=[
         virtual_tryon,
         list_tryon_results,
         get_rate_limit_status,
         batch_multiview_tryon,
-        generate_video_from_results
+        generate_video_from_results,
+        set_video_preference
     ],
     output_key="tryon_result",  # Store final result
     before_model_callback=process_reference_images_callback
@@ -221,8 +329,9 @@ tryon_specialist_agent = LlmAgent(
 # Uses instruction from prompts.py for clean separation of concerns
 root_agent = LlmAgent(
     name="virtual_tryon_coordinator",
-    model="gemini-2.5-flash",
-    instruction=INTERACTIVE_COORDINATOR_INSTRUCTION,
+    model=FLASH_MODEL,
+    generate_content_config=LLM_CONFIG,
+    instruction=static_instruction("INTERACTIVE_COORDINATOR_INSTRUCTION", with_handoff=True),
     description="Interactive coordinator managing user-driven virtual try-on workflow",
     sub_agents=[
         image_manager_agent,
@@ -232,12 +341,22 @@ root_agent = LlmAgent(
     before_model_callback=process_reference_images_callback
 )
 
+class TryOnRunner(Runner):
+    """Runner that lets background artifact saves finish before it closes."""
+    
+    async def close(self):
+        await flush_tasks()
+        await super().close()
+
 # --- Configure and Expose the Runner ---
-runner = Runner(
+runner = TryOnRunner(
     agent=root_agent,
     app_name="virtual_tryon_app",
     session_service=None,  # Using default InMemorySessionService
-    artifact_service=InMemoryArtifactService(),
+    artifact_service=FileBackedArtifactService(),
 )
 
+# Render the instructions now rather than on the first user request
+warm_instructions()
+
 logger.info("🎯 Virtual Try-On Agent System (v3.1.0) - Ready!")
\ No newline at end of file
@@ -0,0 +1,224 @@
+"""
+File-Backed Artifact Service
+
+Stores artifact bytes on disk and keeps only {filename → path} pointers in
+memory, so uploaded and generated images don't stay resident for the
+lifetime of every session. File I/O runs in worker threads to keep the
+event loop free. A small LRU of recently loaded artifacts saves re-reading
+the same person image on every try-on of a session.
+
+The index lives in memory only, so stored files are only reachable for
+the life of the process. By default they go to a private (0700) temporary
+directory that is deleted on close() or at exit.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import quote
+from google.adk.artifacts import BaseArtifactService
+from google.genai.types import Part
+
+logger = logging.getLogger(__name__)
+
+# Root directory for stored artifacts; unset means a new private temporary
+# directory per process
+ARTIFACT_ROOT = os.getenv("ARTIFACT_ROOT") or None
+
+# Default number of loaded artifacts kept in memory
+LOAD_CACHE_SIZE = 16
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    """Write bytes to path, creating parent directories as needed."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _path_component(value: str) -> str:
+    """
+    Make an app/user/session id or filename safe to use as one path component.
+    
+    Separators and other special characters are percent-encoded, so a value
+    like "../x" or "/etc" can't leave the storage root.
+    
+    Raises:
+        ValueError: If the value is empty, "." or ".."
+    """
+    component = quote(value, safe="")
+    if component in ("", ".", ".."):
+        raise ValueError(f"Invalid artifact path component: {value!r}")
+    return component
+
+
+def _read_bytes(path: str) -> bytes:
+    """Read the full contents of path."""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class FileBackedArtifactService(BaseArtifactService):
+    """
+    Artifact service that persists artifact data to the local filesystem.
+    
+    Features:
+    - Every version is written to its own file
+    - Only file paths and MIME types are kept in memory, plus the last few
+      loaded artifacts (stored versions never change, so entries can't go stale)
+    - "user:" prefixed filenames are shared across a user's sessions
+    """
+    
+    def __init__(self, root_dir: Optional[str] = ARTIFACT_ROOT, cache_size: int = LOAD_CACHE_SIZE):
+        """
+        Initialize the artifact service.
+        
+        Args:
+            root_dir: Directory to store artifact files under (default: a new
+                private temporary directory, removed on close)
+            cache_size: Number of loaded artifacts to keep in memory
+        """
+        # Only a directory created here is removed as a whole on close
+        self._owns_root = root_dir is None
+        if root_dir is None:
+            root_dir = tempfile.mkdtemp(prefix="adk-artifacts-")
+        else:
+            os.makedirs(root_dir, mode=0o700, exist_ok=True)
+        self.root_dir = root_dir
+        self.cache_size = cache_size
+        # (app, user, session, filename) -> [(path, mime_type), ...] indexed by version
+        self._index: dict[tuple, list[tuple[str, str]]] = {}
+        # path -> loaded Part, least recently used first
+        self._loaded: OrderedDict[str, Part] = OrderedDict()
+        # path -> write still in progress (loads of that version wait for it)
+        self._writes: dict[str, asyncio.Future] = {}
+        atexit.register(self.close)
+        logger.info("File-backed artifact service storing under %s", root_dir)
+    
+    def close(self) -> None:
+        """
+        Delete the stored files.
+        
+        The index isn't persisted, so the files can't be reached after the
+        process exits. Removes the whole root if it was created here,
+        otherwise only the files this service wrote. Safe to call twice.
+        """
+        if self._owns_root:
+            shutil.rmtree(self.root_dir, ignore_errors=True)
+        else:
+            for versions in self._index.values():
+                for path, _ in versions:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        self._index.clear()
+        self._loaded.clear()
+    
+    @staticmethod
+    def _key(app_name: str, user_id: str, session_id: Optional[str], filename: str) -> tuple:
+        if filename.startswith("user:"):
+            return (app_name, user_id, "user", filename)
+        return (app_name, user_id, session_id, filename)
+    
+    async def save_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: Optional[str] = None,
+        filename: str,
+        artifact: Part,
+        **kwargs
+    ) -> int:
+        if ".." in filename.split("/"):
+            raise ValueError(f"Invalid artifact filename: {filename!r}")
+        key = self._key(app_name, user_id, session_id, filename)
+        versions = self._index.setdefault(key, [])
+        version = len(versions)
+        path = os.path.join(self.root_dir, *map(_path_component, key), f"v{version}")
+        
+        if artifact.inline_data:
+            data, mime_type = artifact.inline_data.data, artifact.inline_data.mime_type
+        else:
+            data, mime_type = (artifact.text or "").encode("utf-8"), "text/plain"
+        
+        # Claim the version before awaiting, so concurrent saves of the same
+        # filename get different versions and paths
+        versions.append((path, mime_type))
+        write = asyncio.ensure_future(asyncio.to_thread(_write_bytes, path, data))
+        self._writes[path] = write
+        try:
+            await write
+        finally:
+            del self._writes[path]
+        return version
+    
+    async def load_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: Optional[str] = None,
+        filename: str,
+        version: Optional[int] = None,
+        **kwargs
+    ) -> Optional[Part]:
+        versions = self._index.get(self._key(app_name, user_id, session_id, filename))
+        if not versions:
+            return None
+        if version is None:
+            version = len(versions) - 1
+        if not 0 <= version < len(versions):
+            return None
+        
+        path, mime_type = versions[version]
+        part = self._loaded.get(path)
+        if part is not None:
+            self._loaded.move_to_end(path)
+            return part
+        
+        write = self._writes.get(path)
+        if write is not None:
+            await asyncio.wait([write])
+        try:
+            data = await asyncio.to_thread(_read_bytes, path)
+        except FileNotFoundError:
+            # The write of this version failed
+            return None
+        part = Part.from_bytes(data=data, mime_type=mime_type)
+        self._loaded[path] = part
+        if len(self._loaded) > self.cache_size:
+            self._loaded.popitem(last=False)
+        return part
+    
+    async def list_artifact_keys(
+        self, *, app_name: str, user_id: str, session_id: Optional[str] = None, **kwargs
+    ) -> list[str]:
+        return sorted(
+            key[3] for key in self._index
+            if key[:2] == (app_name, user_id) and key[2] in (session_id, "user")
+        )
+    
+    async def delete_artifact(
+        self, *, app_name: str, user_id: str, session_id: Optional[str] = None, filename: str, **kwargs
+    ) -> None:
+        versions = self._index.pop(self._key(app_name, user_id, session_id, filename), [])
+        for path, _ in versions:
+            # A later save of the same filename reuses these paths
+            self._loaded.pop(path, None)
+            try:
+                await asyncio.to_thread(os.remove, path)
+            except OSError as e:
+                logger.warning("Could not remove artifact file %s: %s", path, e)
+    
+    async def list_versions(
+        self, *, app_name: str, user_id: str, session_id: Optional[str] = None, filename: str, **kwargs
+    ) -> list[int]:
+        versions = self._index.get(self._key(app_name, user_id, session_id, filename), [])
+        return list(range(len(versions)))
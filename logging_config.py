@@ -0,0 +1,51 @@
+"""
+Logging Configuration for the Virtual Try-On Agent System
+
+Log records are pushed onto an in-memory queue and written to the console
+and log file by a background listener thread, so logging calls in the
+agent callbacks never block on disk I/O.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILE = 'virtual_tryon_agent.log'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """
+    Install a QueueHandler on the root logger and start the listener.
+    
+    Safe to call more than once; only the first call configures logging.
+    
+    Args:
+        level: Root logger level (default: INFO)
+    
+    Returns:
+        The running QueueListener
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    
+    formatter = logging.Formatter(LOG_FORMAT)
+    stream_handler = logging.StreamHandler()
+    file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
+    stream_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+    
+    log_queue = queue.Queue(-1)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
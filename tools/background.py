@@ -0,0 +1,68 @@
+"""
+Background Tasks - Work that finishes after the callback or tool returns
+
+Artifact saves are started as tasks so the agent turn doesn't wait on
+storage. Each task is registered here under a key (see artifact_task_key),
+so a later tool call that needs the result can wait for that one save, and
+shutdown can wait for all of them.
+"""
+
+import asyncio
+from typing import Any, Hashable
+
+# All running tasks (kept so they aren't garbage collected mid-run)
+_tasks: set[asyncio.Task] = set()
+
+# Key -> latest task started under that key
+_named_tasks: dict[Hashable, asyncio.Task] = {}
+
+
+def artifact_task_key(context: Any, filename: str) -> tuple:
+    """
+    Key for a background save of filename in this context's session.
+
+    Filenames like reference_image_v1.png repeat in every session, so the
+    key includes the app, user and session.
+
+    Args:
+        context: callback_context or tool_context
+        filename: Artifact filename
+    """
+    session = context.session
+    return (session.app_name, session.user_id, session.id, filename)
+
+
+def _forget(name: Hashable, task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if _named_tasks.get(name) is task:
+        del _named_tasks[name]
+
+
+def track_task(name: Hashable, task: asyncio.Task) -> asyncio.Task:
+    """
+    Register a background task under a key.
+
+    Args:
+        name: Key for wait_for_task(), e.g. from artifact_task_key()
+        task: The running task
+
+    Returns:
+        The task
+    """
+    _tasks.add(task)
+    _named_tasks[name] = task
+    task.add_done_callback(lambda t: _forget(name, t))
+    return task
+
+
+async def wait_for_task(name: Hashable) -> None:
+    """Wait for the task registered under name, if it is still running (errors are ignored)."""
+    task = _named_tasks.get(name)
+    if task is not None:
+        await asyncio.wait([task])
+
+
+async def flush_tasks() -> None:
+    """Wait for every running background task to finish."""
+    while _tasks:
+        await asyncio.gather(*list(_tasks), return_exceptions=True)
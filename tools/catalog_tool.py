@@ -3,16 +3,97 @@ Catalog Tool - Garment Catalog Management System
 Users can only select garments from the catalog (no uploads allowed)
 """
 
+import functools
 import logging
-from pathlib import Path
-from typing import Optional, List
+import os
+from typing import Optional
 from PIL import Image
-import io
+from google.adk.tools import ToolContext
+from .handoff import update_handoff
 
 logger = logging.getLogger(__name__)
 
 # Catalog directory path
-CATALOG_DIR = Path(__file__).parent.parent / "catalog"
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "catalog")
+
+# Garment image extensions (matched case-insensitively)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def prefetch_catalog_listing() -> None:
+    """
+    Build the catalog listing ahead of the catalog step.
+    
+    Called from the upload callback (in a worker thread) so the catalog
+    scan overlaps with image validation instead of running after it.
+    The result lands in the listing cache used by list_catalog_clothes.
+    """
+    list_catalog_clothes()
+
+
+def _catalog_mtime_ns() -> int:
+    """Directory mtime (ns) used to key the catalog caches; -1 if missing."""
+    # Directory mtime changes whenever a garment is added/removed/renamed,
+    # so keying the caches on it means stale results are never served
+    try:
+        return os.stat(CATALOG_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return -1
+
+
+@functools.lru_cache(maxsize=8)
+def _scan_catalog(catalog_dir: str, mtime_ns: int) -> tuple:
+    """
+    Scan the catalog directory for garment images.
+    
+    Memoized on (directory, mtime_ns); mtime_ns is only part of the cache key.
+    
+    Returns:
+        (names, sizes) - image filenames sorted by name and their sizes in bytes
+    """
+    # One directory pass; the extension test is case-insensitive, so files
+    # are never counted twice on case-insensitive filesystems
+    try:
+        with os.scandir(catalog_dir) as it:
+            entries = sorted(
+                (e for e in it if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS)),
+                key=lambda e: e.name
+            )
+    except FileNotFoundError:
+        return (), ()
+    
+    names = tuple(e.name for e in entries)
+    sizes = tuple(e.stat().st_size for e in entries)
+    return names, sizes
+
+
+@functools.lru_cache(maxsize=64)
+def _selection_details(path: str, file_size: int) -> str:
+    """
+    Format the selection confirmation for a catalog image.
+    
+    Dimensions come from the image header (Image.open never loads the
+    pixel data). Memoized on (path, file_size), so reselecting a garment
+    is a cache lookup; read errors propagate and are not cached.
+    """
+    with Image.open(path) as img:
+        width, height = img.size
+    name = os.path.basename(path)
+    
+    return "\n".join([
+        "✅ **Garment Selected from Catalog**",
+        "",
+        "📦 **Details**:",
+        f"- File: {name}",
+        f"- File Size: {file_size / 1024:.1f} KB",
+        f"- Image Size: {width} x {height} pixels",
+        f"- Aspect Ratio: {width / height:.2f}:1",
+        f"- Location: {path}",
+        "",
+        "✨ Ready for Virtual Try-On!",
+        f"💡 When using `virtual_tryon`, specify the garment file as: **catalog/{name}**",
+        f"📝 Example: virtual_tryon(person='reference_image_v1.png', garment='catalog/{name}')",
+    ])
 
 
 def list_catalog_clothes() -> str:
@@ -23,96 +104,96 @@ def list_catalog_clothes() -> str:
         List of garments with their numbers
     """
     try:
-        # Find all image files in catalog folder
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']:
-            image_files.extend(CATALOG_DIR.glob(ext))
-        
-        image_files = sorted(image_files, key=lambda x: x.name)
-        
-        if not image_files:
-            return "❌ No garments found in catalog\n\nPlease add garment images to the catalog/ folder"
-        
-        result = f"👗 **Garment Catalog** (Total: {len(image_files)} items)\n\n"
-        result += "📋 **Available Garments**:\n\n"
-        
-        for i, img_file in enumerate(image_files, 1):
-            file_size = img_file.stat().st_size / 1024  # KB
-            result += f"{i}. **{img_file.name}** ({file_size:.1f} KB)\n"
-        
-        result += f"\n💡 **How to Use**: Use `select_catalog_cloth` with a number or filename to select a garment\n"
-        result += f"📝 **Example**: select_catalog_cloth(1) or select_catalog_cloth('1.jpg')"
-        
-        return result
+        return _build_catalog_listing(CATALOG_DIR, _catalog_mtime_ns())
         
     except Exception as e:
-        logger.error(f"Error listing catalog clothes: {e}", exc_info=True)
+        logger.error("Error listing catalog clothes: %s", e, exc_info=True)
         return f"❌ Error occurred: {str(e)}"
 
 
-def select_catalog_cloth(identifier: str) -> str:
+@functools.lru_cache(maxsize=8)
+def _build_catalog_listing(catalog_dir: str, mtime_ns: int) -> str:
+    """
+    Format the garment listing for a catalog scan.
+    
+    Memoized on (directory, mtime_ns), like _scan_catalog.
+    """
+    names, sizes = _scan_catalog(catalog_dir, mtime_ns)
+    
+    if not names:
+        return "❌ No garments found in catalog\n\nPlease add garment images to the catalog/ folder"
+    
+    lines = [
+        f"👗 **Garment Catalog** (Total: {len(names)} items)",
+        "",
+        "📋 **Available Garments**:",
+        "",
+    ]
+    lines.extend(
+        f"{i}. **{name}** ({size / 1024:.1f} KB)"  # KB
+        for i, (name, size) in enumerate(zip(names, sizes), 1)
+    )
+    lines.append("")
+    lines.append("💡 **How to Use**: Use `select_catalog_cloth` with a number or filename to select a garment")
+    lines.append("📝 **Example**: select_catalog_cloth(1) or select_catalog_cloth('1.jpg')")
+    
+    return "\n".join(lines)
+
+
+def select_catalog_cloth(identifier: str, tool_context: Optional[ToolContext] = None) -> str:
     """
     Select a garment from the catalog by number or filename.
     
     Args:
         identifier: Number (e.g., "1", "5") or filename (e.g., "1.jpg")
+        tool_context: ADK tool context (records the selection for handoff)
     
     Returns:
         Confirmation message with selected garment
     """
     try:
-        # Find all image files in catalog folder
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']:
-            image_files.extend(CATALOG_DIR.glob(ext))
-        
-        image_files = sorted(image_files, key=lambda x: x.name)
+        names, sizes = _scan_catalog(CATALOG_DIR, _catalog_mtime_ns())
         
-        if not image_files:
+        if not names:
             return "❌ No garments found in catalog"
         
-        selected_file = None
+        identifier = identifier.strip()
+        selected_index = None
         
         # Try to find by number
-        if identifier.isdigit():
+        try:
             index = int(identifier) - 1
-            if 0 <= index < len(image_files):
-                selected_file = image_files[index]
-        
-        # Try to find by filename
-        if not selected_file:
-            for img_file in image_files:
-                if img_file.name.lower() == identifier.lower():
-                    selected_file = img_file
+        except ValueError:
+            index = None
+        if index is not None and 0 <= index < len(names):
+            selected_index = index
+        
+        # Try to find by filename (accepts "catalog/1.jpg" as well as "1.jpg")
+        if selected_index is None:
+            wanted = identifier.removeprefix("catalog/").lower()
+            for index, name in enumerate(names):
+                if name.lower() == wanted:
+                    selected_index = index
                     break
         
-        if not selected_file:
-            available = ", ".join([f"{i}. {f.name}" for i, f in enumerate(image_files, 1)])
+        if selected_index is None:
+            available = ", ".join([f"{i}. {name}" for i, name in enumerate(names, 1)])
             return f"❌ Garment '{identifier}' not found\n\n📋 Available garments:\n{available}\n\n💡 Use `list_catalog_clothes` to see the full list"
         
+        selected_name = names[selected_index]
+        
         # Check image properties
         try:
-            with Image.open(selected_file) as img:
-                width, height = img.size
-                aspect_ratio = width / height
-                file_size = selected_file.stat().st_size / 1024  # KB
+            details = _selection_details(os.path.join(CATALOG_DIR, selected_name), sizes[selected_index])
         except Exception as e:
-            logger.error(f"Error reading image: {e}")
-            return f"❌ Cannot read image file '{selected_file.name}': {str(e)}"
+            logger.error("Error reading image: %s", e)
+            return f"❌ Cannot read image file '{selected_name}': {str(e)}"
         
-        result = f"✅ **Garment Selected from Catalog**\n\n"
-        result += f"📦 **Details**:\n"
-        result += f"- File: {selected_file.name}\n"
-        result += f"- File Size: {file_size:.1f} KB\n"
-        result += f"- Image Size: {width} x {height} pixels\n"
-        result += f"- Aspect Ratio: {aspect_ratio:.2f}:1\n"
-        result += f"- Location: {str(selected_file)}\n\n"
-        result += f"✨ Ready for Virtual Try-On!\n"
-        result += f"💡 When using `virtual_tryon`, specify the garment file as: **catalog/{selected_file.name}**\n"
-        result += f"📝 Example: virtual_tryon(person='reference_image_v1.png', garment='catalog/{selected_file.name}')"
+        if tool_context is not None:
+            update_handoff(tool_context.state, garment=f"catalog/{selected_name}")
         
-        return result
+        return details
         
     except Exception as e:
-        logger.error(f"Error selecting catalog cloth: {e}", exc_info=True)
+        logger.error("Error selecting catalog cloth: %s", e, exc_info=True)
         return f"❌ Error occurred: {str(e)}"
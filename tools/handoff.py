@@ -0,0 +1,65 @@
+"""
+Handoff State - Structured state passed between agents
+
+Instead of each sub-agent digging filenames out of the conversation
+history, tools record the current working files in one small dict in
+session state. The agent instruction providers render it as a compact
+block at the end of each sub-agent's instruction.
+"""
+
+from typing import Any, Optional
+
+# Session state key holding the handoff dict
+HANDOFF_KEY = "handoff"
+
+# Handoff field -> label shown to the agents (in display order)
+HANDOFF_FIELDS = {
+    "person_image": "Person image",
+    "multiview_set": "Multi-view images",
+    "garment": "Selected garment",
+    "last_tryon_result": "Latest try-on result",
+    "tryon_results": "Latest batch results",
+    "video_after_batch": "Video after batch (user preference)",
+}
+
+
+def update_handoff(state: Any, **fields) -> None:
+    """
+    Update handoff fields in session state.
+    
+    The dict is replaced rather than mutated in place so the change is
+    recorded in the session's state delta.
+    
+    Args:
+        state: Session state (tool_context.state or callback_context.state)
+        **fields: Handoff fields to set (None clears a field)
+    """
+    handoff = dict(state.get(HANDOFF_KEY) or {})
+    for key, value in fields.items():
+        if value is None:
+            handoff.pop(key, None)
+        else:
+            handoff[key] = value
+    state[HANDOFF_KEY] = handoff
+
+
+def format_handoff(state: Any) -> Optional[str]:
+    """
+    Render the handoff state as a short markdown block.
+    
+    Returns:
+        The block, or None if nothing has been handed off yet
+    """
+    handoff = state.get(HANDOFF_KEY) or {}
+    lines = []
+    for key, label in HANDOFF_FIELDS.items():
+        value = handoff.get(key)
+        if not value:
+            continue
+        if isinstance(value, dict):
+            value = ", ".join(f"{view}: {filename}" for view, filename in value.items())
+        lines.append(f"- {label}: {value}")
+    
+    if not lines:
+        return None
+    return "**Current Handoff State:**\n" + "\n".join(lines)
@@ -1,54 +1,166 @@
 """
 Rate Limiter for API calls to prevent excessive usage.
 
-This module provides a simple rate limiting mechanism to control
+This module provides a token-bucket rate limiting mechanism to control
 the frequency of API calls, especially for expensive operations
-like image generation.
+like image generation. Short bursts are allowed while the long-run
+rate stays at one call per cooldown period.
+
+A sliding-window counter (SlidingWindowCounter) is available for
+"N calls per window" limits; select it with strategy="sliding_window".
 """
 
+import asyncio
 import time
 import logging
+from collections import deque
 from typing import Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
 
-class RateLimiter:
+class _WaitingLimiter:
+    """Blocking and async waits shared by the limiter implementations."""
+    
+    # Limiters sit on every API call path; slots keep attribute access cheap
+    __slots__ = ("_waiters", "last_call_time", "_last_call_iso")
+    
+    def __init__(self):
+        # Futures of coroutines queued in _wait_turn(), head first
+        self._waiters: deque[asyncio.Future] = deque()
+        # Wall-clock time of the last call, for display only
+        self.last_call_time: Optional[float] = None
+        # ISO-8601 (UTC) form of last_call_time, built once per call for get_stats()
+        self._last_call_iso: Optional[str] = None
+    
+    def _stamp_call(self) -> None:
+        """Record the wall-clock time of a call for display."""
+        self.last_call_time = time.time()
+        self._last_call_iso = datetime.fromtimestamp(self.last_call_time, timezone.utc).isoformat().replace("+00:00", "Z")
+    
+    def wait_if_needed(self) -> float:
+        """
+        Block until the next call is allowed.
+        
+        For synchronous callers only; async code should use await_if_needed().
+        
+        Returns:
+            Time waited in seconds
+        """
+        wait_time = self.time_until_next_call()
+        if wait_time > 0:
+            logger.info("Rate limit: waiting %.1fs before next API call", wait_time)
+            time.sleep(wait_time)
+        return wait_time
+    
+    async def _wait_turn(self, attempt, what: str) -> float:
+        """
+        Retry attempt() in first-come order until it returns <= 0.
+        
+        attempt() returns seconds to wait (> 0) or <= 0 once it succeeded.
+        Only the coroutine at the head of the queue sleeps; the others wait on
+        a future that the head resolves when it leaves, so each freed slot
+        wakes exactly one waiter instead of every sleeper rechecking. The
+        head's check and the caller's following record_call() run without an
+        await in between, and the next waiter only runs after that.
+        
+        Returns:
+            Time waited in seconds
+        """
+        if not self._waiters and attempt() <= 0:
+            return 0.0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        turn = loop.create_future()
+        self._waiters.append(turn)
+        try:
+            if self._waiters[0] is not turn:
+                await turn
+            while True:
+                wait_time = attempt()
+                if wait_time <= 0:
+                    return loop.time() - started
+                logger.info("Rate limit: waiting %.1fs %s", wait_time, what)
+                await asyncio.sleep(wait_time)
+        finally:
+            self._waiters.remove(turn)
+            if self._waiters and not self._waiters[0].done():
+                self._waiters[0].set_result(None)
+    
+    async def await_if_needed(self) -> float:
+        """
+        Wait until the next call is allowed without blocking the event loop.
+        
+        Waiters are served in arrival order; call record_call() right after
+        this returns, without awaiting anything in between.
+        
+        Returns:
+            Time waited in seconds
+        """
+        return await self._wait_turn(self.time_until_next_call, "before next API call")
+    
+    async def reserve_async(self, n: int) -> float:
+        """
+        Wait without blocking the event loop, then take n calls at once.
+        
+        Use before issuing n concurrent API calls; the callers then skip
+        their own checks and record_call().
+        
+        Returns:
+            Time waited in seconds
+        """
+        return await self._wait_turn(lambda: self.reserve(n), f"to reserve {n} API calls")
+
+
+class RateLimiter(_WaitingLimiter):
     """
-    A simple rate limiter that enforces a minimum time between API calls.
+    A token-bucket rate limiter for API calls.
     
     Features:
-    - Configurable cooldown period between calls
-    - Tracks last call timestamp
+    - Allows a burst of up to `burst` back-to-back calls
+    - Refills one token every `cooldown_seconds` (steady-state rate unchanged)
     - Provides time remaining until next call is allowed
     - Thread-safe for single-process applications
     """
     
-    def __init__(self, cooldown_seconds: float = 5.0):
+    __slots__ = ("cooldown_seconds", "burst", "tokens", "last_refill_time", "total_calls")
+    
+    def __init__(self, cooldown_seconds: float = 5.0, burst: int = 3):
         """
         Initialize the rate limiter.
         
         Args:
-            cooldown_seconds: Minimum seconds between API calls (default: 5.0)
+            cooldown_seconds: Seconds to refill one call token (default: 5.0)
+            burst: Maximum number of calls allowed back-to-back (default: 3)
         """
+        super().__init__()
         self.cooldown_seconds = cooldown_seconds
-        self.last_call_time: Optional[float] = None
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.last_refill_time = time.monotonic()
         self.total_calls = 0
-        logger.info(f"Rate limiter initialized with {cooldown_seconds}s cooldown")
+        logger.info("Rate limiter initialized with burst of %s, refill every %ss", self.burst, cooldown_seconds)
+    
+    def _refill(self) -> None:
+        """Add tokens for the time elapsed since the last refill."""
+        now = time.monotonic()
+        if self.cooldown_seconds > 0:
+            earned = (now - self.last_refill_time) / self.cooldown_seconds
+            self.tokens = min(float(self.burst), self.tokens + earned)
+        else:
+            self.tokens = float(self.burst)
+        self.last_refill_time = now
     
     def can_make_call(self) -> bool:
         """
-        Check if enough time has passed since the last call.
+        Check if a call token is available.
         
         Returns:
-            True if call is allowed, False if still in cooldown
+            True if call is allowed, False if the bucket is empty
         """
-        if self.last_call_time is None:
-            return True
-        
-        elapsed = time.time() - self.last_call_time
-        return elapsed >= self.cooldown_seconds
+        self._refill()
+        return self.tokens >= 1.0
     
     def time_until_next_call(self) -> float:
         """
@@ -57,35 +169,181 @@ class RateLimiter:
         Returns:
             Seconds to wait (0 if call is allowed now)
         """
-        if self.last_call_time is None:
+        self._refill()
+        if self.tokens >= 1.0:
             return 0.0
+        return (1.0 - self.tokens) * self.cooldown_seconds
+    
+    def record_call(self):
+        """Record that an API call was made (consumes one token)."""
+        self._refill()
+        # No clamp at zero: debt left by reserve() must still be paid off
+        self.tokens -= 1.0
+        self._stamp_call()
+        self.total_calls += 1
+        logger.debug("API call recorded (total: %s, tokens left: %.2f)", self.total_calls, self.tokens)
+    
+    def reserve(self, n: int) -> float:
+        """
+        Take n call tokens at once if they are available.
         
-        elapsed = time.time() - self.last_call_time
-        remaining = self.cooldown_seconds - elapsed
-        return max(0.0, remaining)
+        Requests larger than the bucket wait for a full bucket and leave it
+        in debt, so later calls wait longer and the long-run rate holds.
+        
+        Args:
+            n: Number of calls to reserve
+        
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they will be
+            available (nothing is taken)
+        """
+        self._refill()
+        needed = min(float(n), float(self.burst))
+        if self.tokens < needed:
+            return (needed - self.tokens) * self.cooldown_seconds
+        self.tokens -= n
+        self._stamp_call()
+        self.total_calls += n
+        logger.debug("Reserved %s API calls (total: %s, tokens left: %.2f)", n, self.total_calls, self.tokens)
+        return 0.0
     
-    def wait_if_needed(self) -> float:
+    def reset(self):
+        """Reset the rate limiter state (refills the bucket)."""
+        self.tokens = float(self.burst)
+        self.last_refill_time = time.monotonic()
+        self.last_call_time = None
+        self._last_call_iso = None
+        logger.info("Rate limiter reset")
+    
+    def get_stats(self) -> dict:
         """
-        Block until the next call is allowed.
+        Get statistics about rate limiter usage.
         
         Returns:
-            Time waited in seconds
+            Dictionary with stats: total_calls, last_call_time, time_until_next,
+            tokens_available, burst
         """
-        wait_time = self.time_until_next_call()
-        if wait_time > 0:
-            logger.info(f"Rate limit: waiting {wait_time:.1f}s before next API call")
-            time.sleep(wait_time)
-        return wait_time
+        time_until_next = self.time_until_next_call()
+        return {
+            "total_calls": self.total_calls,
+            "last_call_time": self._last_call_iso,
+            "time_until_next_call": time_until_next,
+            "tokens_available": max(0, int(self.tokens)),
+            "burst": self.burst,
+            "cooldown_seconds": self.cooldown_seconds
+        }
+
+
+class SlidingWindowCounter(_WaitingLimiter):
+    """
+    A sliding-window counter rate limiter: at most `limit` calls per `window_seconds`.
+    
+    Keeps only the call counts of the current and previous fixed windows and
+    weights the previous one by how much of it still overlaps the sliding
+    window, so checks are O(1) with no per-call history.
+    
+    Exposes the same interface as RateLimiter (burst = limit).
+    """
+    
+    __slots__ = (
+        "window_seconds", "limit", "burst", "cooldown_seconds",
+        "_current_count", "_prev_count", "_window_start", "total_calls",
+    )
+    
+    def __init__(self, window_seconds: float = 60.0, limit: int = 12):
+        """
+        Initialize the limiter.
+        
+        Args:
+            window_seconds: Length of the sliding window (default: 60.0)
+            limit: Maximum calls per window (default: 12)
+        """
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.limit = max(1, limit)
+        self.burst = self.limit
+        # Average spacing, reported as the refill period in get_stats()
+        self.cooldown_seconds = window_seconds / self.limit
+        self._current_count = 0
+        self._prev_count = 0
+        self._window_start = time.monotonic()
+        self.total_calls = 0
+        logger.info("Sliding-window rate limiter initialized: %s calls per %ss", self.limit, window_seconds)
+    
+    def _roll(self, now: float) -> float:
+        """Advance to the window containing now; return time elapsed in it."""
+        elapsed_windows = int((now - self._window_start) // self.window_seconds)
+        if elapsed_windows >= 1:
+            self._prev_count = self._current_count if elapsed_windows == 1 else 0
+            self._current_count = 0
+            self._window_start += elapsed_windows * self.window_seconds
+        return now - self._window_start
+    
+    def _weighted_count(self, elapsed: float) -> float:
+        return self._current_count + self._prev_count * (1.0 - elapsed / self.window_seconds)
+    
+    def can_make_call(self) -> bool:
+        """Check if the estimated calls in the sliding window are below the limit."""
+        return self._weighted_count(self._roll(time.monotonic())) < self.limit
+    
+    def _time_until_room(self, n: int) -> float:
+        """Seconds until n more calls fit in the window (0 if they fit now)."""
+        elapsed = self._roll(time.monotonic())
+        # A request larger than the limit only waits for an empty window
+        threshold = max(1, self.limit - n + 1)
+        if self._weighted_count(elapsed) < threshold:
+            return 0.0
+        window = self.window_seconds
+        if self._current_count < threshold:
+            # Wait for enough of the previous window to slide out
+            return max(0.0, window * (1.0 - (threshold - self._current_count) / self._prev_count) - elapsed)
+        # Current window is full: it becomes the previous one at the boundary
+        return (window - elapsed) + window * (1.0 - threshold / self._current_count)
+    
+    def time_until_next_call(self) -> float:
+        """
+        Calculate seconds remaining until next call is allowed.
+        
+        Returns:
+            Seconds to wait (0 if call is allowed now)
+        """
+        return self._time_until_room(1)
     
     def record_call(self):
         """Record that an API call was made."""
-        self.last_call_time = time.time()
+        self._roll(time.monotonic())
+        self._current_count += 1
+        self._stamp_call()
         self.total_calls += 1
-        logger.debug(f"API call recorded (total: {self.total_calls})")
+        logger.debug("API call recorded (total: %s, in window: %s)", self.total_calls, self._current_count)
+    
+    def reserve(self, n: int) -> float:
+        """
+        Take n calls at once if they fit in the window.
+        
+        Args:
+            n: Number of calls to reserve
+        
+        Returns:
+            0 if the calls were taken, otherwise seconds until they will fit
+            (nothing is taken)
+        """
+        wait_time = self._time_until_room(n)
+        if wait_time > 0:
+            return wait_time
+        self._current_count += n
+        self._stamp_call()
+        self.total_calls += n
+        logger.debug("Reserved %s API calls (total: %s, in window: %s)", n, self.total_calls, self._current_count)
+        return 0.0
     
     def reset(self):
-        """Reset the rate limiter state."""
+        """Reset the limiter state (clears both windows)."""
+        self._current_count = 0
+        self._prev_count = 0
+        self._window_start = time.monotonic()
         self.last_call_time = None
+        self._last_call_iso = None
         logger.info("Rate limiter reset")
     
     def get_stats(self) -> dict:
@@ -93,34 +351,64 @@ class RateLimiter:
         Get statistics about rate limiter usage.
         
         Returns:
-            Dictionary with stats: total_calls, last_call_time, time_until_next
+            Same keys as RateLimiter.get_stats(); tokens_available is the
+            number of calls left in the sliding window
         """
+        time_until_next = self.time_until_next_call()
+        remaining = self.limit - self._weighted_count(time.monotonic() - self._window_start)
         return {
             "total_calls": self.total_calls,
-            "last_call_time": datetime.fromtimestamp(self.last_call_time).isoformat() if self.last_call_time else None,
-            "time_until_next_call": self.time_until_next_call(),
+            "last_call_time": self._last_call_iso,
+            "time_until_next_call": time_until_next,
+            "tokens_available": max(0, int(remaining)),
+            "burst": self.limit,
             "cooldown_seconds": self.cooldown_seconds
         }
 
 
 # Global rate limiter instance for image generation API
-# Default: 5 seconds between calls to prevent API abuse
-_global_rate_limiter: Optional[RateLimiter] = None
+# Default: burst of 3 calls, refilling one call every 5 seconds
+_global_rate_limiter: Optional[_WaitingLimiter] = None
 
 
-def get_rate_limiter(cooldown_seconds: float = 5.0) -> RateLimiter:
+def _create_rate_limiter(
+    cooldown_seconds: float,
+    burst: int,
+    strategy: str,
+    window_seconds: float,
+    limit: int
+) -> _WaitingLimiter:
+    """Build a limiter for the given strategy (see get_rate_limiter)."""
+    if strategy == "sliding_window":
+        return SlidingWindowCounter(window_seconds, limit)
+    return RateLimiter(cooldown_seconds, burst)
+
+
+def get_rate_limiter(
+    cooldown_seconds: float = 5.0,
+    burst: int = 3,
+    strategy: str = "token_bucket",
+    window_seconds: float = 60.0,
+    limit: int = 12
+) -> _WaitingLimiter:
     """
     Get or create the global rate limiter instance.
     
+    All arguments are only used on first call.
+    
     Args:
-        cooldown_seconds: Cooldown period (only used on first call)
+        cooldown_seconds: Token refill period (token_bucket)
+        burst: Bucket size (token_bucket)
+        strategy: "token_bucket" (default) or "sliding_window"
+        window_seconds: Window length (sliding_window)
+        limit: Maximum calls per window (sliding_window)
     
     Returns:
-        Global RateLimiter instance
+        Global rate limiter instance (RateLimiter or SlidingWindowCounter)
     """
     global _global_rate_limiter
     if _global_rate_limiter is None:
-        _global_rate_limiter = RateLimiter(cooldown_seconds)
+        _global_rate_limiter = _create_rate_limiter(cooldown_seconds, burst, strategy, window_seconds, limit)
     return _global_rate_limiter
 
 
@@ -131,13 +419,23 @@ def reset_rate_limiter():
         _global_rate_limiter.reset()
 
 
-def configure_rate_limiter(cooldown_seconds: float):
+def configure_rate_limiter(
+    cooldown_seconds: float,
+    burst: int = 3,
+    strategy: str = "token_bucket",
+    window_seconds: float = 60.0,
+    limit: int = 12
+):
     """
     Reconfigure the global rate limiter with new settings.
     
     Args:
-        cooldown_seconds: New cooldown period
+        cooldown_seconds: New token refill period (token_bucket)
+        burst: New bucket size (token_bucket)
+        strategy: "token_bucket" (default) or "sliding_window"
+        window_seconds: New window length (sliding_window)
+        limit: New maximum calls per window (sliding_window)
     """
     global _global_rate_limiter
-    _global_rate_limiter = RateLimiter(cooldown_seconds)
-    logger.info(f"Rate limiter reconfigured with {cooldown_seconds}s cooldown")
+    _global_rate_limiter = _create_rate_limiter(cooldown_seconds, burst, strategy, window_seconds, limit)
+    logger.info("Rate limiter reconfigured (%s)", strategy)
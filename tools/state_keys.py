@@ -0,0 +1,36 @@
+"""
+Session State Keys - Names of the state entries shared between tools
+
+Keys read or written in more than one place are defined once here so
+the callback, the tools and the handoff code can't drift apart.
+"""
+
+# Number of person images uploaded this session (drives reference_image_vN)
+REFERENCE_IMAGE_COUNT_KEY = "reference_image_count"
+
+# Filenames of this session's uploads in order (.webp or .png, by stored format)
+REFERENCE_IMAGES_KEY = "reference_images"
+
+# Filename of the most recent person image upload
+LATEST_REFERENCE_IMAGE_KEY = "latest_reference_image"
+
+# Version tracking for generated assets (see update_asset_version)
+ASSETS_KEY = "assets"
+
+# Try-on results keyed by request content hash (see tryon_cache_key)
+TRYON_CACHE_KEY = "tryon_cache"
+
+# Latest single try-on result filename
+LAST_TRYON_RESULT_KEY = "last_tryon_result"
+
+# Latest generated image filename (any tool)
+LAST_GENERATED_IMAGE_KEY = "last_generated_image"
+
+# {view: filename} of the latest multiview set
+LATEST_MULTIVIEW_SET_KEY = "latest_multiview_set"
+
+# {view: filename} of the latest batch try-on results
+LATEST_BATCH_TRYON_KEY = "latest_batch_tryon"
+
+# Gemini Batch Mode try-on job still running (see batch_multiview_tryon)
+PENDING_BATCH_JOB_KEY = "pending_batch_job"
@@ -17,31 +17,97 @@ Technologies:
 """
 
 import os
+import hashlib
+import json
 import logging
+import random
+from dataclasses import dataclass
 from typing import Optional
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types
-from google.genai.types import Image as GenAIImage
 from google.adk.tools import ToolContext
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from dotenv import load_dotenv
 from PIL import Image
 import io
-import base64
-import requests
 import time
 import asyncio
+from collections import OrderedDict
+from pathlib import Path
+from .background import artifact_task_key, track_task, wait_for_task
 from .rate_limiter import get_rate_limiter
+from .handoff import update_handoff
+from .state_keys import (
+    ASSETS_KEY,
+    LAST_GENERATED_IMAGE_KEY,
+    LAST_TRYON_RESULT_KEY,
+    LATEST_BATCH_TRYON_KEY,
+    LATEST_MULTIVIEW_SET_KEY,
+    LATEST_REFERENCE_IMAGE_KEY,
+    PENDING_BATCH_JOB_KEY,
+    REFERENCE_IMAGE_COUNT_KEY,
+    REFERENCE_IMAGES_KEY,
+    TRYON_CACHE_KEY,
+)
 
 load_dotenv()
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Gemini API key, read once at import (after .env is loaded)
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+if not GEMINI_API_KEY:
+    logger.warning("GEMINI_API_KEY is not set; try-on and multiview tools will fail")
+
 # Get rate limiter configuration from environment
 # Rate limiter prevents excessive API calls
 RATE_LIMIT_COOLDOWN = float(os.getenv("RATE_LIMIT_COOLDOWN", "5.0"))
-rate_limiter = get_rate_limiter(RATE_LIMIT_COOLDOWN)
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "3"))
+# "token_bucket" (default) or "sliding_window" (RATE_LIMIT_MAX_CALLS per RATE_LIMIT_WINDOW seconds)
+RATE_LIMIT_STRATEGY = os.getenv("RATE_LIMIT_STRATEGY", "token_bucket")
+RATE_LIMIT_WINDOW = float(os.getenv("RATE_LIMIT_WINDOW", "60.0"))
+RATE_LIMIT_MAX_CALLS = int(os.getenv("RATE_LIMIT_MAX_CALLS", "12"))
+
+def get_tryon_rate_limiter():
+    """
+    Get the shared rate limiter, creating it with the settings above on first use.
+    
+    Deferred so importing this module doesn't build (and log) a limiter for
+    agent flows that never call the image API.
+    """
+    return get_rate_limiter(
+        RATE_LIMIT_COOLDOWN, RATE_LIMIT_BURST,
+        strategy=RATE_LIMIT_STRATEGY, window_seconds=RATE_LIMIT_WINDOW, limit=RATE_LIMIT_MAX_CALLS
+    )
+
+# Serializes "pick next version -> save artifact -> record version" so
+# concurrent try-ons (batch mode) never get the same result filename
+_result_save_lock = asyncio.Lock()
+
+# Leading bytes of the image formats Gemini returns (PNG, JPEG, WebP)
+IMAGE_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"RIFF")
+
+# Shared Gemini clients by API key (created on first use, see get_genai_client)
+_genai_clients: dict[Optional[str], genai.Client] = {}
+
+def get_genai_client(api_key: Optional[str] = None) -> genai.Client:
+    """
+    Get or create the shared Gemini client for an API key.
+    
+    One client per key per process keeps its HTTP connection pool, so
+    repeated calls reuse warm connections instead of a new TLS handshake
+    each time.
+    
+    Args:
+        api_key: Key to use (default: GEMINI_API_KEY)
+    """
+    api_key = api_key or GEMINI_API_KEY
+    client = _genai_clients.get(api_key)
+    if client is None:
+        client = _genai_clients[api_key] = genai.Client(api_key=api_key)
+    return client
 
 def get_next_version_number(tool_context: ToolContext, asset_name: str) -> int:
     """
@@ -49,39 +115,180 @@ def get_next_version_number(tool_context: ToolContext, asset_name: str) -> int:
     
     Used to maintain version history of generated images.
     """
-    asset_versions = tool_context.state.get("asset_versions", {})
-    current_version = asset_versions.get(asset_name, 0)
-    next_version = current_version + 1
-    return next_version
+    asset = tool_context.state.get(ASSETS_KEY, {}).get(asset_name, {})
+    return asset.get("current", 0) + 1
+
+# Versions kept per asset in state; older entries are dropped
+ASSET_HISTORY_LIMIT = 50
 
 def update_asset_version(tool_context: ToolContext, asset_name: str, version: int, filename: str) -> None:
     """
     Update version tracking information for an asset in the state.
     
-    Maintains complete version history for each asset.
+    Keeps the last ASSET_HISTORY_LIMIT versions of each asset plus a running
+    total, so state synced every turn stays small in long sessions. All
+    assets live in one state entry, which is read once and written back
+    once as a copy so the change is recorded as a state delta.
     """
-    if "asset_versions" not in tool_context.state:
-        tool_context.state["asset_versions"] = {}
-    if "asset_filenames" not in tool_context.state:
-        tool_context.state["asset_filenames"] = {}
-    
-    tool_context.state["asset_versions"][asset_name] = version
-    tool_context.state["asset_filenames"][asset_name] = filename
-    
-    # Maintain complete history of all versions
-    asset_history_key = f"{asset_name}_history"
-    if asset_history_key not in tool_context.state:
-        tool_context.state[asset_history_key] = []
-    tool_context.state[asset_history_key].append({"version": version, "filename": filename})
+    assets = dict(tool_context.state.get(ASSETS_KEY) or {})
+    previous = assets.get(asset_name, {})
+    history = previous.get("history", [])
+    assets[asset_name] = {
+        "current": version,
+        "filename": filename,
+        "total": previous.get("total", len(history)) + 1,
+        "history": history[-(ASSET_HISTORY_LIMIT - 1):] + [{"version": version, "filename": filename}],
+    }
+    tool_context.state[ASSETS_KEY] = assets
 
 def create_versioned_filename(asset_name: str, version: int, file_extension: str = "png") -> str:
     """
     Create a versioned filename for an asset.
     
     Example: tryon_result_v1.png, tryon_result_v2.png
+    
+    Kept for external callers; the try-on save path inlines the f-string.
     """
     return f"{asset_name}_v{version}.{file_extension}"
 
+def tryon_cache_key(person_image, garment_image, garment_type: str, additional_instructions: str, result_name: str) -> str:
+    """
+    Build a content-hash key for a try-on request.
+    
+    Hashes the actual image bytes (not filenames), so re-uploads of the same
+    photo hit the cache and edited catalog files never do. The model name is
+    included so switching TRYON_MODEL doesn't return older models' results.
+    """
+    digest = hashlib.sha256()
+    for part in (person_image, garment_image):
+        digest.update(hashlib.sha256(part.inline_data.data).digest())
+    for text in (garment_type, additional_instructions, result_name, TRYON_MODEL):
+        digest.update(b"\0" + text.encode("utf-8"))
+    return digest.hexdigest()
+
+# Try-on results remembered per session; the oldest entries are dropped first
+TRYON_CACHE_SIZE = 128
+
+def record_tryon_cache(tool_context: ToolContext, cache_key: str, filename: Optional[str], version: int = 0) -> None:
+    """Remember the result of a try-on request for this session (None forgets it)."""
+    cache = dict(tool_context.state.get(TRYON_CACHE_KEY) or {})
+    cache.pop(cache_key, None)
+    if filename is not None:
+        cache[cache_key] = {"filename": filename, "version": version}
+        # Dicts keep insertion order, so the first keys are the oldest
+        for stale in list(cache)[:-TRYON_CACHE_SIZE]:
+            del cache[stale]
+    tool_context.state[TRYON_CACHE_KEY] = cache
+
+# Try-on results shared across a user's sessions and process restarts. They
+# are plain files rather than artifacts, so they outlive the artifact
+# service's in-memory index and can be overwritten and deleted in place:
+#   {PERSISTENT_CACHE_DIR}/{scope}/index.json - cache key -> MIME type, oldest first
+#   {PERSISTENT_CACHE_DIR}/{scope}/{cache key} - result image bytes
+# where scope is a hash of (app_name, user_id). Directories are private (0700).
+PERSISTENT_CACHE_DIR = os.getenv("TRYON_CACHE_DIR") or os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "adk-design-agent", "tryon_cache"
+)
+PERSISTENT_CACHE_SIZE = 1024
+
+# (app_name, user_id) -> {cache key: MIME type}, least recently used first
+# (read from index.json on first use)
+_persistent_caches: dict[tuple[str, str], OrderedDict[str, str]] = {}
+_persistent_cache_lock = asyncio.Lock()
+
+def _persistent_cache_scope(tool_context: ToolContext) -> tuple[str, str]:
+    return tool_context.session.app_name, tool_context.user_id
+
+def _persistent_cache_path(scope: tuple[str, str], name: str) -> str:
+    # Hashed so client-supplied ids can't form paths outside the cache dir
+    scope_dir = hashlib.sha256("\0".join(scope).encode("utf-8")).hexdigest()[:32]
+    return os.path.join(PERSISTENT_CACHE_DIR, scope_dir, name)
+
+def _read_file(path: str) -> Optional[bytes]:
+    """Read the full contents of path, or None if it doesn't exist."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _write_persistent_files(scope: tuple[str, str], cache_key: str, data: bytes, index: bytes, stale: list) -> None:
+    """Write one result image and the new index, and remove evicted images."""
+    os.makedirs(PERSISTENT_CACHE_DIR, mode=0o700, exist_ok=True)
+    os.makedirs(_persistent_cache_path(scope, ""), mode=0o700, exist_ok=True)
+    with open(_persistent_cache_path(scope, cache_key), 'wb') as f:
+        f.write(data)
+    for key in stale:
+        try:
+            os.remove(_persistent_cache_path(scope, key))
+        except FileNotFoundError:
+            pass
+    # Replace the index atomically so a crash never leaves it half written
+    index_path = _persistent_cache_path(scope, "index.json")
+    with open(index_path + ".tmp", 'wb') as f:
+        f.write(index)
+    os.replace(index_path + ".tmp", index_path)
+
+async def _persistent_cache(scope: tuple[str, str]) -> OrderedDict[str, str]:
+    """Get the persistent cache index for a user, reading it on first use."""
+    cache = _persistent_caches.get(scope)
+    if cache is None:
+        index = await asyncio.to_thread(_read_file, _persistent_cache_path(scope, "index.json"))
+        loaded = OrderedDict(json.loads(index)) if index else OrderedDict()
+        cache = _persistent_caches.setdefault(scope, loaded)
+    return cache
+
+async def load_persisted_result(tool_context: ToolContext, cache_key: str) -> Optional[types.Part]:
+    """Return a result image saved by an earlier session, or None."""
+    try:
+        scope = _persistent_cache_scope(tool_context)
+        cache = await _persistent_cache(scope)
+        mime_type = cache.get(cache_key)
+        if mime_type is None:
+            return None
+        data = await asyncio.to_thread(_read_file, _persistent_cache_path(scope, cache_key))
+        if data is None:
+            # Image file was removed outside the app; forget it
+            cache.pop(cache_key, None)
+            return None
+        cache.move_to_end(cache_key)
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+    except Exception as e:
+        logger.warning("Could not read persistent try-on cache: %s", e)
+        return None
+
+async def _persist_result(scope: tuple[str, str], cache_key: str, image_part: types.Part) -> None:
+    try:
+        async with _persistent_cache_lock:
+            cache = await _persistent_cache(scope)
+            cache[cache_key] = image_part.inline_data.mime_type
+            cache.move_to_end(cache_key)
+            stale = []
+            while len(cache) > PERSISTENT_CACHE_SIZE:
+                stale.append(cache.popitem(last=False)[0])
+            index = json.dumps(cache).encode("utf-8")
+            await asyncio.to_thread(
+                _write_persistent_files, scope, cache_key, image_part.inline_data.data, index, stale
+            )
+    except Exception as e:
+        logger.warning("Could not update persistent try-on cache: %s", e)
+
+def persist_result(tool_context: ToolContext, cache_key: str, image_part: types.Part) -> None:
+    """
+    Save a result image for later sessions.
+    
+    The write runs in the background so the try-on returns without waiting
+    for it; failures are logged and never fail the try-on.
+    """
+    try:
+        scope = _persistent_cache_scope(tool_context)
+        track_task(
+            f"tryon_cache:{cache_key}",
+            asyncio.create_task(_persist_result(scope, cache_key, image_part)),
+        )
+    except Exception as e:
+        logger.warning("Could not update persistent try-on cache: %s", e)
+
 def validate_image_aspect_ratio(image_data: bytes, expected_ratio: tuple = (9, 16), tolerance: float = 0.1) -> tuple[bool, str]:
     """
     Validate if image has the expected aspect ratio.
@@ -112,9 +319,59 @@ def validate_image_aspect_ratio(image_data: bytes, expected_ratio: tuple = (9, 1
         else:
             return False, f"⚠️ Image aspect ratio {width}x{height} (ratio: {actual_ratio:.2f}) is not close to {expected_ratio[0]}:{expected_ratio[1]} (expected: {expected:.2f}). Results may not be optimal."
     except Exception as e:
-        logger.warning(f"Could not validate image aspect ratio: {e}")
+        logger.warning("Could not validate image aspect ratio: %s", e)
         return True, "⚠️ Could not validate aspect ratio, proceeding anyway"
 
+# Garment catalog directory (project root / catalog)
+_CATALOG_ROOT = Path(__file__).parent.parent / "catalog"
+
+# Catalog file suffix -> MIME type (anything else is sent as JPEG)
+_CATALOG_MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+
+# Catalog images are large, so the cache is bounded by total bytes
+CATALOG_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Catalog path -> (mtime_ns, Part), most recently used last
+_catalog_parts: OrderedDict[str, tuple[int, types.Part]] = OrderedDict()
+_catalog_cache_bytes = 0
+
+def _read_catalog_file(path, cached_mtime_ns: Optional[int] = None) -> tuple[Optional[int], Optional[bytes]]:
+    """
+    Read a catalog file unless the cached copy is still current.
+    
+    Returns:
+        (mtime_ns, data); data is None when the file is unchanged since
+        cached_mtime_ns, and both are None if the file doesn't exist
+    """
+    try:
+        with open(path, 'rb') as f:
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            if mtime_ns == cached_mtime_ns:
+                return mtime_ns, None
+            return mtime_ns, f.read()
+    except FileNotFoundError:
+        return None, None
+
+def _cache_catalog_part(key: str, mtime_ns: int, part: types.Part) -> None:
+    """Store a catalog Part, evicting least recently used entries over budget."""
+    global _catalog_cache_bytes
+    size = len(part.inline_data.data)
+    if size > CATALOG_CACHE_MAX_BYTES:
+        return
+    old = _catalog_parts.pop(key, None)
+    if old is not None:
+        _catalog_cache_bytes -= len(old[1].inline_data.data)
+    _catalog_parts[key] = (mtime_ns, part)
+    _catalog_cache_bytes += size
+    while _catalog_cache_bytes > CATALOG_CACHE_MAX_BYTES:
+        _, (_, evicted) = _catalog_parts.popitem(last=False)
+        _catalog_cache_bytes -= len(evicted.inline_data.data)
+
 async def load_image(tool_context: ToolContext, filename: str):
     """
     Load an image from artifacts or catalog directory.
@@ -124,61 +381,71 @@ async def load_image(tool_context: ToolContext, filename: str):
     - Catalog: Garment images from catalog/ directory
     """
     try:
+        # An upload from this turn may still be saving in the background
+        await wait_for_task(artifact_task_key(tool_context, filename))
+        
         # First, try loading from artifacts (user uploads)
         loaded_part = await tool_context.load_artifact(filename)
         if loaded_part:
-            logger.info(f"✅ Successfully loaded image from artifacts: {filename}")
+            logger.info("✅ Successfully loaded image from artifacts: %s", filename)
             return loaded_part
         
         # If not found in artifacts, check catalog directory
-        from pathlib import Path
-        
-        # Support both "catalog/1.jpg" and "1.jpg" formats
-        if filename.startswith("catalog/"):
-            catalog_path = Path(__file__).parent.parent / filename
-        else:
-            # Try to find it in catalog directory
-            catalog_path = Path(__file__).parent.parent / "catalog" / filename
+        # (supports both "catalog/1.jpg" and "1.jpg" formats)
+        catalog_path = _CATALOG_ROOT / filename.removeprefix("catalog/")
         
         # If catalog file exists, read and create Part object
-        if catalog_path.exists():
-            logger.info(f"📂 Loading image from catalog: {catalog_path}")
-            with open(catalog_path, 'rb') as f:
-                image_data = f.read()
-            
-            # Determine MIME type
-            import mimetypes
-            mime_type, _ = mimetypes.guess_type(str(catalog_path))
-            if not mime_type:
-                mime_type = "image/jpeg"  # default
+        # (file I/O runs in a worker thread so concurrent try-ons aren't blocked;
+        # an unchanged file is served from the in-memory cache)
+        cache_key = str(catalog_path)
+        cached = _catalog_parts.get(cache_key)
+        mtime_ns, image_data = await asyncio.to_thread(
+            _read_catalog_file, catalog_path, cached[0] if cached else None
+        )
+        if cached and mtime_ns == cached[0]:
+            _catalog_parts.move_to_end(cache_key)
+            logger.info("✅ Loaded image from catalog cache: %s", filename)
+            return cached[1]
+        if image_data is not None:
+            logger.info("📂 Loaded image from catalog: %s", catalog_path)
             
-            from google.genai.types import Part
-            part = Part.from_bytes(data=image_data, mime_type=mime_type)
-            logger.info(f"✅ Successfully loaded image from catalog: {filename}")
+            mime_type = _CATALOG_MIME_TYPES.get(catalog_path.suffix.lower(), "image/jpeg")
+            part = types.Part.from_bytes(data=image_data, mime_type=mime_type)
+            _cache_catalog_part(cache_key, mtime_ns, part)
+            logger.info("✅ Successfully loaded image from catalog: %s", filename)
             return part
         
-        logger.warning(f"⚠️ Image not found in artifacts or catalog: {filename}")
+        logger.warning("⚠️ Image not found in artifacts or catalog: %s", filename)
         return None
         
     except Exception as e:
-        logger.error(f"Error loading image {filename}: {e}")
+        logger.error("Error loading image %s: %s", filename, e)
         return None
 
 def list_tryon_results(tool_context: ToolContext) -> str:
     """List all virtual try-on results created in this session."""
-    asset_versions = tool_context.state.get("asset_versions", {})
-    if not asset_versions:
+    assets = tool_context.state.get(ASSETS_KEY, {})
+    if not assets:
         return "📭 No virtual try-on results have been created yet."
     
-    info_lines = ["Virtual Try-On Results:"]
-    for asset_name, current_version in asset_versions.items():
-        history_key = f"{asset_name}_history"
-        history = tool_context.state.get(history_key, [])
-        total_versions = len(history)
-        latest_filename = tool_context.state.get("asset_filenames", {}).get(asset_name, "Unknown")
-        info_lines.append(f"  • {asset_name}: {total_versions} result(s), latest is v{current_version} ({latest_filename})")
-    
-    return "\n".join(info_lines)
+    return "Virtual Try-On Results:\n" + "\n".join(
+        f"  • {asset_name}: {asset.get('total', len(asset['history']))} result(s), "
+        f"latest is v{asset['current']} ({asset.get('filename', 'Unknown')})"
+        for asset_name, asset in assets.items()
+    )
+
+# Closing hints for list_reference_images, by whether a try-on is possible yet
+_ONE_IMAGE_HINT = (
+    "\n⚠️ You need 2 images for virtual try-on:\n"
+    "   • First image should be: 👤 Person (full body or upper body)\n"
+    "   • Please upload: 👔 Garment/clothing image"
+)
+_READY_HINT = (
+    "\n✅ You have enough images for virtual try-on!\n"
+    "   • 💡 Use the filenames above when calling virtual_tryon\n"
+    "   • 📝 Example: person_image_filename='reference_image_v1.png'\n"
+    "   • 📝 Example: garment_image_filename='reference_image_v2.png'"
+)
 
 def list_reference_images(tool_context: ToolContext) -> str:
     """
@@ -186,37 +453,18 @@ def list_reference_images(tool_context: ToolContext) -> str:
     
     Returns formatted information about available images.
     """
-    reference_images = tool_context.state.get("reference_images", {})
-    if not reference_images:
+    total_count = tool_context.state.get(REFERENCE_IMAGE_COUNT_KEY, 0)
+    if not total_count:
         return "📭 No images have been uploaded yet.\n\n📋 Please upload:\n1. 👤 Person image (9:16 aspect ratio)\n2. 👔 Garment/clothing image (9:16 aspect ratio)"
     
-    info_lines = ["📁 Uploaded images:"]
-    
-    # Sort by filename for consistent ordering
-    sorted_images = sorted(reference_images.items())
-    
-    for idx, (filename, info) in enumerate(sorted_images, 1):
-        version = info.get("version", "Unknown")
-        info_lines.append(f"  {idx}. 🖼️ {filename} (v{version})")
-    
-    total_count = len(reference_images)
-    info_lines.append(f"\n📊 Total: {total_count} image(s) uploaded")
-    
-    if total_count == 1:
-        info_lines.append("\n⚠️ You need 2 images for virtual try-on:")
-        info_lines.append("   • First image should be: 👤 Person (full body or upper body)")
-        info_lines.append("   • Please upload: 👔 Garment/clothing image")
-    elif total_count >= 2:
-        info_lines.append("\n✅ You have enough images for virtual try-on!")
-        info_lines.append("   • 💡 Use the filenames above when calling virtual_tryon")
-        info_lines.append("   • 📝 Example: person_image_filename='reference_image_v1.png'")
-        info_lines.append("   • 📝 Example: garment_image_filename='reference_image_v2.png'")
-    else:
-        info_lines.append("\n⚠️ Please upload 2 images:")
-        info_lines.append("   1. 👤 Person image (full body or upper body, 9:16 ratio)")
-        info_lines.append("   2. 👔 Garment/clothing image (9:16 ratio)")
-    
-    return "\n".join(info_lines)
+    # Uploads are numbered sequentially by the upload callback
+    filenames = tool_context.state.get(REFERENCE_IMAGES_KEY, [])
+    listing = "\n".join(
+        f"  {version}. 🖼️ {filename} (v{version})"
+        for version, filename in enumerate(filenames, 1)
+    )
+    hint = _ONE_IMAGE_HINT if total_count == 1 else _READY_HINT
+    return f"📁 Uploaded images:\n{listing}\n\n📊 Total: {total_count} image(s) uploaded\n{hint}"
 
 
 class ClearImagesInput(BaseModel):
@@ -233,29 +481,53 @@ def clear_reference_images(tool_context: ToolContext, inputs: ClearImagesInput)
     if not inputs.confirm:
         return "❌ Deletion cancelled. Set confirm=True to delete all reference images."
     
-    reference_images = tool_context.state.get("reference_images", {})
-    if not reference_images:
+    state = tool_context.state
+    count = state.get(REFERENCE_IMAGE_COUNT_KEY, 0)
+    if not count:
         return "📭 No reference images to delete."
     
-    count = len(reference_images)
-    
     # Clear the state
-    tool_context.state["reference_images"] = {}
-    tool_context.state["latest_reference_image"] = None
+    state[REFERENCE_IMAGE_COUNT_KEY] = 0
+    state[REFERENCE_IMAGES_KEY] = []
+    state[LATEST_REFERENCE_IMAGE_KEY] = None
+    update_handoff(state, person_image=None, multiview_set=None)
     
     return f"✅ Successfully deleted {count} reference image(s). 🆕 You can now upload new images."
 
 
+VIDEO_PREFERENCES = ("ask", "always", "never")
+
+
+def set_video_preference(tool_context: ToolContext, preference: str) -> str:
+    """
+    Remember whether to generate a video after each batch try-on.
+    
+    Args:
+        preference: 'always' (generate without asking), 'never' (don't offer),
+            or 'ask' (ask after every batch)
+    
+    Returns:
+        Confirmation message
+    """
+    preference = preference.strip().lower()
+    if preference not in VIDEO_PREFERENCES:
+        return f"❌ Unknown preference '{preference}'. Use one of: {', '.join(VIDEO_PREFERENCES)}."
+    
+    update_handoff(tool_context.state, video_after_batch=preference)
+    return f"✅ Video preference saved: {preference}"
+
+
 def get_rate_limit_status(tool_context: ToolContext) -> str:
     """
     Get current rate limit status and API usage statistics.
     
     Returns detailed information about API call patterns.
     """
-    stats = rate_limiter.get_stats()
+    stats = get_tryon_rate_limiter().get_stats()
     
     status_lines = ["📊 Rate Limit Status:"]
-    status_lines.append(f"   • ⏱️ Cooldown period: {stats['cooldown_seconds']:.1f} seconds")
+    status_lines.append(f"   • 🪙 Calls available now: {stats['tokens_available']}/{stats['burst']}")
+    status_lines.append(f"   • ⏱️ Refill: 1 call every {stats['cooldown_seconds']:.1f} seconds")
     status_lines.append(f"   • 📞 Total API calls made: {stats['total_calls']}")
     
     if stats['last_call_time']:
@@ -271,125 +543,161 @@ def get_rate_limit_status(tool_context: ToolContext) -> str:
         status_lines.append(f"   • ⏱️ Time until next call: Ready now")
         status_lines.append(f"   • 🚦 Status: ✅ Ready for API call")
     
+    if stats['tokens_available'] >= 3:
+        status_lines.append(f"   • 📦 Enough calls for a full 3-view batch - no need to check again before it")
+    
     status_lines.append(f"\n💡 Tip: Rate limiting prevents API overuse and ensures stable service.")
-    status_lines.append(f"   🔧 You can adjust RATE_LIMIT_COOLDOWN in .env file (currently {RATE_LIMIT_COOLDOWN}s)")
+    status_lines.append(f"   🔧 You can adjust RATE_LIMIT_COOLDOWN and RATE_LIMIT_BURST in .env file (currently {RATE_LIMIT_COOLDOWN}s, burst {RATE_LIMIT_BURST})")
     
     return "\n".join(status_lines)
 
 
-# ============================================================================
-# 🎭 Virtual Try-On - Main Function
-# ============================================================================
+# Most image generation requests in flight at once, whatever the rate
+# limiter allows; too many concurrent streams make Gemini slow down or reject
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+_gemini_slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
 
-class VirtualTryOnInput(BaseModel):
-    """Input model for virtual try-on operation."""
-    person_image_filename: str = Field(
-        ..., 
-        description="Filename of the person image (e.g., 'reference_image_v1.png')"
-    )
-    garment_image_filename: str = Field(
-        ..., 
-        description="Filename of the garment image (e.g., 'reference_image_v2.png' or 'catalog/1.jpg')"
-    )
-    result_name: str = Field(
-        default="tryon_result", 
-        description="Name for the try-on result (auto-versioned)"
-    )
-    additional_instructions: Optional[str] = Field(
-        default="", 
-        description="Optional: Additional instructions for the try-on"
-    )
-    garment_type: str = Field(
-        default="auto", 
-        description="Garment type: 'short-sleeve', 'long-sleeve', 'sleeveless', 'dress', 'jacket', or 'auto'"
-    )
-    # NOTE: Size control removed due to Gemini model limitations
-    # The model cannot reliably generate different sizes based on text prompts
-
-async def virtual_tryon(
-    tool_context: ToolContext,
-    person_image_filename: str,
-    garment_image_filename: str,
-    result_name: str = "tryon_result",
-    additional_instructions: Optional[str] = "",
-    garment_type: str = "auto"
-) -> str:
+async def _generate_image(client, model: str, parts: list, config, label: str) -> Optional[types.Part]:
     """
-    🎭 Virtual Try-On - Apply garments onto person images using AI
+    Run one image generation request and return the generated image Part.
     
-    This function performs photorealistic virtual try-on by combining:
-    - A person image (full body or upper body)
-    - A garment/clothing image
+    Shared by try-on and multiview generation. Waits for one of the
+    GEMINI_MAX_CONCURRENCY slots first; the rate limiter still decides how
+    often calls may start.
     
-    The AI preserves the person's pose and features while applying the garment naturally.
+    Returns:
+        The image Part, or None if neither mode produced one
+    """
+    async with _gemini_slots:
+        return await _stream_image(client, model, parts, config, label)
+
+# Transient Gemini errors (rate limited, overloaded, server errors) are
+# retried with jittered exponential backoff before giving up on a mode
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+
+async def _with_retry(call, label: str):
+    """
+    Await call() and retry it on transient API errors.
     
     Args:
-        tool_context: ADK tool context
-        person_image_filename: Person image filename
-        garment_image_filename: Garment image filename (from uploads or catalog)
-        result_name: Output filename prefix (will be auto-versioned)
-        additional_instructions: Optional custom instructions
-        garment_type: Type of garment for better fit handling
+        call: Zero-argument function returning a fresh awaitable per attempt
+        label: Name used in log messages
+    """
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return await call()
+        except genai_errors.APIError as e:
+            if e.code not in RETRYABLE_STATUS_CODES or attempt == RETRY_ATTEMPTS - 1:
+                raise
+            delay = RETRY_BASE_DELAY * 2 ** attempt + random.uniform(0, 0.1)
+            logger.warning("%s: API error %s, retrying in %.1fs", label, e.code, delay)
+            await asyncio.sleep(delay)
+
+async def _read_image_stream(client, model: str, contents: list, config, label: str) -> Optional[types.Part]:
+    """
+    Stream one image generation request and return the generated image Part.
     
-    Returns:
-        Status message with result filename
+    A large image can arrive split across several inline_data parts, so
+    they are collected and returned as one Part. A part that starts with an
+    image signature while data is buffered is a second image and ends the read.
     
-    Note: Size/fit control removed due to Gemini model limitations.
-    The model cannot reliably produce different sizes from text prompts alone.
+    Returns:
+        The image Part, or None if the stream carried no image
     """
-    if "GEMINI_API_KEY" not in os.environ:
-        raise ValueError("❌ GEMINI_API_KEY environment variable not set.")
-
-    # Rate limiting check
-    if not rate_limiter.can_make_call():
-        wait_time = rate_limiter.time_until_next_call()
-        logger.info(f"⏳ Rate limit active. Wait {wait_time:.1f}s")
-        return (
-            f"⏳ Rate limit active. Please wait {wait_time:.1f} seconds before trying again."
-        )
+    image_data = bytearray()
+    image_mime_type = None
+    # Async client so concurrent generations (batch mode) overlap
+    stream = await client.aio.models.generate_content_stream(
+        model=model, contents=contents, config=config
+    )
+    try:
+        async for chunk in stream:
+            if not chunk.candidates or not chunk.candidates[0].content:
+                continue
 
-    logger.info("🎭 Starting virtual try-on...")
+            second_image = False
+            for part in chunk.candidates[0].content.parts:
+                if part.inline_data and part.inline_data.data:
+                    data = part.inline_data.data
+                    if image_data and data.startswith(IMAGE_SIGNATURES):
+                        second_image = True
+                        break
+                    image_data.extend(data)
+                    image_mime_type = image_mime_type or part.inline_data.mime_type
+                elif part.text and logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("%s stream text: %s", label, part.text)
+            if second_image or (image_data and chunk.candidates[0].finish_reason):
+                break
+    finally:
+        # Release the HTTP stream as soon as the image is complete
+        await stream.aclose()
+
+    if not image_data:
+        return None
+    return types.Part(
+        inline_data=types.Blob(mime_type=image_mime_type, data=bytes(image_data))
+    )
 
+async def _stream_image(client, model: str, parts: list, config, label: str) -> Optional[types.Part]:
+    """
+    Run one image generation request, streamed first.
+    
+    Each mode is retried on transient API errors. Falls back to a
+    non-streaming call if the stream fails or yields no image.
+    
+    Returns:
+        The image Part, or None if neither mode produced one
+    """
+    contents = [types.Content(role="user", parts=parts)]
+    
+    # --- Streamed generation ---
     try:
-        # Wrap arguments into Pydantic model for validation
-        inputs = VirtualTryOnInput(
-            person_image_filename=person_image_filename,
-            garment_image_filename=garment_image_filename,
-            result_name=result_name,
-            additional_instructions=additional_instructions or "",
-            garment_type=garment_type
+        image_part = await _with_retry(
+            lambda: _read_image_stream(client, model, contents, config, label), label
         )
-        
-        # Log the try-on parameters
-        logger.info(f"🎯 Try-on parameters: Type={inputs.garment_type}")
-        print(f"📦 Using garment type: {inputs.garment_type}")
+        if image_part is not None:
+            return image_part
+        logger.warning("%s: no inline image data found. Falling back to non-streaming...", label)
 
-        client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+    except Exception as stream_err:
+        logger.error("%s: streaming failed: %s", label, stream_err)
 
-        # Load person image
-        logger.info(f"Loading person image: {inputs.person_image_filename}")
-        person_image = await load_image(tool_context, inputs.person_image_filename)
-        if not person_image:
-            return f"❌ Error: Could not load person image '{inputs.person_image_filename}'."
+    # --- Fallback non-streaming ---
+    # (async client too, so a fallback doesn't stall the other try-ons in a batch)
+    resp = await _with_retry(
+        lambda: client.aio.models.generate_content(model=model, contents=contents, config=config), label
+    )
+    if resp.candidates and resp.candidates[0].content:
+        for part in resp.candidates[0].content.parts:
+            if part.inline_data and part.inline_data.data:
+                return part
+    return None
 
-        # Load garment image
-        logger.info(f"Loading garment image: {inputs.garment_image_filename}")
-        garment_image = await load_image(tool_context, inputs.garment_image_filename)
-        if not garment_image:
-            return f"❌ Error: Could not load garment image '{inputs.garment_image_filename}'."
 
-        # Build garment-specific instructions
-        garment_specific = ""
-        if inputs.garment_type == "short-sleeve":
-            garment_specific = "\n⚠️ SHORT-SLEEVE: Show bare arms below sleeve edge."
-        elif inputs.garment_type == "long-sleeve":
-            garment_specific = "\n⚠️ LONG-SLEEVE: Cover arms completely."
-        elif inputs.garment_type == "sleeveless":
-            garment_specific = "\n⚠️ SLEEVELESS: Show bare shoulders and arms."
+# ============================================================================
+# 🎭 Virtual Try-On - Main Function
+# ============================================================================
 
-        # Enhanced try-on prompt optimized for ultra-high quality and photorealism
-        # Emphasizes maximum detail, sharpness, and professional photography quality
-        tryon_prompt = f"""Create an ULTRA-HIGH QUALITY, PHOTOREALISTIC virtual try-on image showing the person from the first image wearing the garment from the second image.
+# Image model and generation settings for try-ons
+TRYON_MODEL = "gemini-2.5-flash-image-preview"
+TRYON_CONFIG = types.GenerateContentConfig(
+    response_modalities=["IMAGE", "TEXT"],
+    temperature=0.4,  # Lower temperature for more consistent, high-quality results
+)
+
+# Sleeve handling line added to the prompt for known garment types
+_GARMENT_SPECIFIC = {
+    "short-sleeve": "\n⚠️ SHORT-SLEEVE: Show bare arms below sleeve edge.",
+    "long-sleeve": "\n⚠️ LONG-SLEEVE: Cover arms completely.",
+    "sleeveless": "\n⚠️ SLEEVELESS: Show bare shoulders and arms.",
+}
+
+# Enhanced try-on prompt optimized for ultra-high quality and photorealism
+# Emphasizes maximum detail, sharpness, and professional photography quality
+# (str.format fields: garment_specific, additional)
+_TRYON_PROMPT_TEMPLATE = """Create an ULTRA-HIGH QUALITY, PHOTOREALISTIC virtual try-on image showing the person from the first image wearing the garment from the second image.
 
 {garment_specific}
 
@@ -446,90 +754,255 @@ IMPORTANT: If the new garment has different sleeve length than original clothing
 - Sleeveless garment → Show natural shoulders and arms (remove all sleeves)
 - Remove any visible parts of the original clothing (like undershirt sleeves showing through)
 
-{f"ADDITIONAL INSTRUCTIONS: {inputs.additional_instructions}" if inputs.additional_instructions else ""}
+{additional}
 
 Output: Generate the virtual try-on image in 9:16 portrait aspect ratio with the specified size and fit characteristics clearly visible."""
 
-        # Use high-quality model for better image generation
-        model = "gemini-2.5-flash-image-preview"
-        contents = [
-            types.Content(
-                role="user",
-                parts=[person_image, garment_image, types.Part.from_text(text=tryon_prompt)],
-            )
-        ]
-        
-        # Configure for maximum image quality and detail
-        generate_content_config = types.GenerateContentConfig(
-            response_modalities=["IMAGE", "TEXT"],
-            temperature=0.4,  # Lower temperature for more consistent, high-quality results
+def build_tryon_prompt(garment_type: str, additional_instructions: str = "") -> str:
+    """Build the try-on prompt for a garment type and optional extra instructions."""
+    return _TRYON_PROMPT_TEMPLATE.format(
+        garment_specific=_GARMENT_SPECIFIC.get(garment_type, ""),
+        additional=f"ADDITIONAL INSTRUCTIONS: {additional_instructions}" if additional_instructions else "",
+    )
+
+async def save_tryon_result(tool_context: ToolContext, result_name: str, image_part: types.Part) -> tuple[str, int]:
+    """
+    Save a generated try-on image as the next version of result_name.
+    
+    Updates version tracking, the latest-result state keys and the handoff.
+    
+    Returns:
+        Tuple of (filename, version)
+    """
+    async with _result_save_lock:
+        version = get_next_version_number(tool_context, result_name)
+        filename = f"{result_name}_v{version}.png"
+        logger.info("Saving try-on result as: %s", filename)
+        await tool_context.save_artifact(filename=filename, artifact=image_part)
+        update_asset_version(tool_context, result_name, version, filename)
+    state = tool_context.state
+    state[LAST_TRYON_RESULT_KEY] = filename
+    state[LAST_GENERATED_IMAGE_KEY] = filename
+    state["current_result_name"] = result_name
+    state["current_asset_name"] = result_name
+    update_handoff(state, last_tryon_result=filename)
+    return filename, version
+
+
+class VirtualTryOnInput(BaseModel):
+    """Input model for virtual try-on operation."""
+    # Built once per call from the tool arguments and never modified
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
+    person_image_filename: str = Field(
+        ..., 
+        description="Filename of the person image (e.g., 'reference_image_v1.png')"
+    )
+    garment_image_filename: str = Field(
+        ..., 
+        description="Filename of the garment image (e.g., 'reference_image_v2.png' or 'catalog/1.jpg')"
+    )
+    result_name: str = Field(
+        default="tryon_result", 
+        description="Name for the try-on result (auto-versioned)"
+    )
+    additional_instructions: Optional[str] = Field(
+        default="", 
+        description="Optional: Additional instructions for the try-on"
+    )
+    garment_type: str = Field(
+        default="auto", 
+        description="Garment type: 'short-sleeve', 'long-sleeve', 'sleeveless', 'dress', 'jacket', or 'auto'"
+    )
+    # NOTE: Size control removed due to Gemini model limitations
+    # The model cannot reliably generate different sizes based on text prompts
+
+@dataclass(frozen=True)
+class TryOnResult:
+    """Outcome of one try-on; message is the text shown to the agent."""
+    ok: bool
+    filename: Optional[str]
+    version: Optional[int]
+    message: str
+    
+    @classmethod
+    def saved(cls, filename: str, version: int) -> "TryOnResult":
+        return cls(True, filename, version, f"✅ Virtual Try-On Successful!\n📁 Result: {filename} (v{version})")
+    
+    @classmethod
+    def reused(cls, filename: str, version: int) -> "TryOnResult":
+        return cls(True, filename, version, f"✅ Virtual Try-On Successful (cached)!\n📁 Result: {filename} (v{version})")
+    
+    @classmethod
+    def failed(cls, message: str) -> "TryOnResult":
+        return cls(False, None, None, message)
+    
+    def __str__(self) -> str:
+        return self.message
+
+
+async def _reuse_tryon_result(tool_context: ToolContext, inputs: VirtualTryOnInput, cache_key: str) -> Optional[TryOnResult]:
+    """
+    Return an earlier result for this request, or None if it must be generated.
+    
+    Checks the session cache, then the persistent cache. Neither costs an
+    API call.
+    """
+    # Same person + garment + options already tried this session: reuse it
+    state = tool_context.state
+    cached = state.get(TRYON_CACHE_KEY, {}).get(cache_key)
+    if cached and cached["filename"] not in await tool_context.list_artifacts():
+        # Result artifact is gone (e.g. deleted); generate it again
+        record_tryon_cache(tool_context, cache_key, None)
+        cached = None
+    if cached:
+        cached_filename = cached["filename"]
+        logger.info("♻️ Reusing cached try-on result: %s", cached_filename)
+        state[LAST_TRYON_RESULT_KEY] = cached_filename
+        state[LAST_GENERATED_IMAGE_KEY] = cached_filename
+        update_handoff(state, last_tryon_result=cached_filename)
+        return TryOnResult.reused(cached_filename, cached["version"])
+
+    # Produced in an earlier session: save a copy here instead of calling Gemini
+    persisted = await load_persisted_result(tool_context, cache_key)
+    if persisted is not None:
+        logger.info("♻️ Reusing try-on result from an earlier session")
+        filename, version = await save_tryon_result(tool_context, inputs.result_name, persisted)
+        record_tryon_cache(tool_context, cache_key, filename, version)
+        return TryOnResult.reused(filename, version)
+    return None
+
+async def _generate_tryon(
+    tool_context: ToolContext,
+    inputs: VirtualTryOnInput,
+    person_image: types.Part,
+    garment_image: types.Part,
+    cache_key: str,
+    rate_reserved: bool = False
+) -> TryOnResult:
+    """
+    Generate a try-on image and save it.
+    
+    batch_multiview_tryon passes rate_reserved=True for calls it already
+    reserved from the rate limiter.
+    """
+    # Rate limiting check
+    rate_limiter = get_tryon_rate_limiter()
+    if not rate_reserved and not rate_limiter.can_make_call():
+        wait_time = rate_limiter.time_until_next_call()
+        logger.info("⏳ Rate limit active. Wait %.1fs", wait_time)
+        return TryOnResult.failed(
+            f"⏳ Rate limit active. Please wait {wait_time:.1f} seconds before trying again."
         )
 
-        # Record API call
+    # Only requests that will reach the model get the client
+    client = get_genai_client()
+
+    tryon_prompt = build_tryon_prompt(inputs.garment_type, inputs.additional_instructions)
+
+    # Record API call
+    if not rate_reserved:
         rate_limiter.record_call()
-        logger.info(f"API call recorded. Total calls: {rate_limiter.total_calls}")
+        logger.info("API call recorded. Total calls: %s", rate_limiter.total_calls)
 
-        # --- Streamed generation ---
-        image_saved = False
-        try:
-            for chunk in client.models.generate_content_stream(
-                model=model, contents=contents, config=generate_content_config
-            ):
-                if not chunk.candidates or not chunk.candidates[0].content:
-                    continue
+    image_part = await _generate_image(
+        client, TRYON_MODEL,
+        [person_image, garment_image, types.Part.from_text(text=tryon_prompt)],
+        TRYON_CONFIG, "Try-on"
+    )
+    if image_part is None:
+        return TryOnResult.failed("❌ No image was generated in either mode.")
+
+    try:
+        filename, version = await save_tryon_result(tool_context, inputs.result_name, image_part)
+        record_tryon_cache(tool_context, cache_key, filename, version)
+        persist_result(tool_context, cache_key, image_part)
+        return TryOnResult.saved(filename, version)
+    except Exception as e:
+        logger.error("Error saving artifact: %s", e)
+        return TryOnResult.failed(f"❌ Error saving try-on result: {e}")
+
+async def _virtual_tryon_core(
+    tool_context: ToolContext,
+    inputs: VirtualTryOnInput,
+    person_image: types.Part,
+    garment_image: types.Part
+) -> TryOnResult:
+    """Run a try-on on images that are already loaded, reusing a cached result if there is one."""
+    cache_key = tryon_cache_key(
+        person_image, garment_image, inputs.garment_type,
+        inputs.additional_instructions, inputs.result_name
+    )
+    reused = await _reuse_tryon_result(tool_context, inputs, cache_key)
+    if reused is not None:
+        return reused
+    return await _generate_tryon(tool_context, inputs, person_image, garment_image, cache_key)
+
+async def virtual_tryon(
+    tool_context: ToolContext,
+    person_image_filename: str,
+    garment_image_filename: str,
+    result_name: str = "tryon_result",
+    additional_instructions: Optional[str] = "",
+    garment_type: str = "auto"
+) -> str:
+    """
+    🎭 Virtual Try-On - Apply garments onto person images using AI
+    
+    This function performs photorealistic virtual try-on by combining:
+    - A person image (full body or upper body)
+    - A garment/clothing image
+    
+    The AI preserves the person's pose and features while applying the garment naturally.
+    
+    Args:
+        tool_context: ADK tool context
+        person_image_filename: Person image filename
+        garment_image_filename: Garment image filename (from uploads or catalog)
+        result_name: Output filename prefix (will be auto-versioned)
+        additional_instructions: Optional custom instructions
+        garment_type: Type of garment for better fit handling
+    
+    Returns:
+        Status message with result filename
+    
+    Note: Size/fit control removed due to Gemini model limitations.
+    The model cannot reliably produce different sizes from text prompts alone.
+    """
+    if not GEMINI_API_KEY:
+        raise ValueError("❌ GEMINI_API_KEY environment variable not set.")
+
+    logger.info("🎭 Starting virtual try-on...")
 
-                for part in chunk.candidates[0].content.parts:
-                    if part.inline_data and part.inline_data.data:
-                        image_part = types.Part(inline_data=part.inline_data)
-                        version = get_next_version_number(tool_context, inputs.result_name)
-                        filename = create_versioned_filename(inputs.result_name, version)
-                        logger.info(f"Saving try-on result as: {filename}")
-                        try:
-                            saved_version = await tool_context.save_artifact(
-                                filename=filename, artifact=image_part
-                            )
-                            update_asset_version(tool_context, inputs.result_name, version, filename)
-                            tool_context.state["last_tryon_result"] = filename
-                            tool_context.state["last_generated_image"] = filename
-                            tool_context.state["current_result_name"] = inputs.result_name
-                            tool_context.state["current_asset_name"] = inputs.result_name
-                            image_saved = True
-                            return (
-                                f"✅ Virtual Try-On Successful!\n📁 Result: {filename} (v{version})"
-                            )
-                        except Exception as e:
-                            logger.error(f"Error saving artifact: {e}")
-                            return f"❌ Error saving try-on result: {e}"
-
-            if not image_saved:
-                logger.warning("No inline image data found. Falling back to non-streaming...")
-
-        except Exception as stream_err:
-            logger.error(f"Streaming failed: {stream_err}")
-
-        # --- Fallback non-streaming ---
-        resp = client.models.generate_content(
-            model=model, contents=contents, config=generate_content_config
+    try:
+        # Wrap arguments into Pydantic model for validation
+        inputs = VirtualTryOnInput(
+            person_image_filename=person_image_filename,
+            garment_image_filename=garment_image_filename,
+            result_name=result_name,
+            additional_instructions=additional_instructions or "",
+            garment_type=garment_type
         )
-        if resp.candidates and resp.candidates[0].content:
-            for part in resp.candidates[0].content.parts:
-                if part.inline_data and part.inline_data.data:
-                    image_part = types.Part(inline_data=part.inline_data)
-                    version = get_next_version_number(tool_context, inputs.result_name)
-                    filename = create_versioned_filename(inputs.result_name, version)
-                    try:
-                        saved_version = await tool_context.save_artifact(
-                            filename=filename, artifact=image_part
-                        )
-                        update_asset_version(tool_context, inputs.result_name, version, filename)
-                        return (
-                            f"✅ Virtual Try-On Successful (non-streamed)!\n📁 Result: {filename} (v{version})"
-                        )
-                    except Exception as e:
-                        logger.error(f"Error saving artifact: {e}")
-                        return f"❌ Error saving try-on result: {e}"
-
-        return "❌ No image was generated in either mode."
+        
+        # Log the try-on parameters
+        logger.info("🎯 Try-on parameters: Type=%s", inputs.garment_type)
+
+        # Load person and garment images concurrently (independent reads)
+        logger.info(
+            "Loading person image: %s, garment image: %s",
+            inputs.person_image_filename, inputs.garment_image_filename
+        )
+        person_image, garment_image = await asyncio.gather(
+            load_image(tool_context, inputs.person_image_filename),
+            load_image(tool_context, inputs.garment_image_filename),
+        )
+        if not person_image:
+            return f"❌ Error: Could not load person image '{inputs.person_image_filename}'."
+        if not garment_image:
+            return f"❌ Error: Could not load garment image '{inputs.garment_image_filename}'."
+
+        result = await _virtual_tryon_core(tool_context, inputs, person_image, garment_image)
+        return result.message
 
     except Exception as e:
         logger.exception("Virtual try-on error")
@@ -542,6 +1015,178 @@ class BatchMultiviewTryOnInput(BaseModel):
     result_name_prefix: str = Field(default="tryon_result", description="Prefix for result filenames")
 
 
+# Send batch try-ons through Gemini Batch Mode (half price, but jobs can take
+# minutes) instead of concurrent streaming calls
+GEMINI_BATCH_MODE = os.getenv("GEMINI_BATCH_MODE", "0") == "1"
+# Seconds one tool call polls a batch job before leaving it for the next call
+BATCH_MODE_MAX_WAIT = float(os.getenv("BATCH_MODE_MAX_WAIT", "20"))
+_BATCH_DONE_STATES = ("JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
+
+
+async def _submit_batch_job(tool_context: ToolContext, pending: list, inputs: BatchMultiviewTryOnInput) -> dict:
+    """
+    Submit one inline Batch Mode request per view that isn't cached.
+    
+    Views whose person image doesn't load are left out of the job and
+    reported as failed, like the streaming path does.
+    
+    Returns:
+        The job record for state. Each view is a dict with "view",
+        "person_image", "cache_key", "cached" ([filename, version] or None)
+        and "error" (message or None); "name" is None when no view was
+        submitted.
+    """
+    garment_image, *person_images = await asyncio.gather(
+        load_image(tool_context, inputs.garment_image_filename),
+        *(load_image(tool_context, person_image_filename) for _, person_image_filename in pending),
+    )
+    if not garment_image:
+        raise ValueError(f"Could not load garment image '{inputs.garment_image_filename}'")
+    
+    views = []
+    batch_requests = []
+    for (view_name, person_image_filename), person_image in zip(pending, person_images):
+        view = {"view": view_name, "person_image": person_image_filename, "cache_key": None, "cached": None, "error": None}
+        views.append(view)
+        if not person_image:
+            view["error"] = f"❌ Error: Could not load person image '{person_image_filename}'."
+            continue
+        view_inputs = VirtualTryOnInput(
+            person_image_filename=person_image_filename,
+            garment_image_filename=inputs.garment_image_filename,
+            result_name=inputs.result_name_prefix,
+            additional_instructions=f"This is the {view_name} view of the person.",
+            garment_type="auto"
+        )
+        cache_key = tryon_cache_key(
+            person_image, garment_image, view_inputs.garment_type,
+            view_inputs.additional_instructions, view_inputs.result_name
+        )
+        view["cache_key"] = cache_key
+        reused = await _reuse_tryon_result(tool_context, view_inputs, cache_key)
+        if reused is not None:
+            view["cached"] = [reused.filename, reused.version]
+            continue
+        batch_requests.append(types.InlinedRequest(
+            model=TRYON_MODEL,
+            contents=[types.Content(role="user", parts=[
+                person_image,
+                garment_image,
+                types.Part.from_text(text=build_tryon_prompt(view_inputs.garment_type, view_inputs.additional_instructions)),
+            ])],
+            config=TRYON_CONFIG,
+        ))
+    
+    job_info = {
+        "name": None,
+        "views": views,
+        "garment": inputs.garment_image_filename,
+        "result_name": inputs.result_name_prefix,
+    }
+    if batch_requests:
+        job = await get_genai_client().aio.batches.create(
+            model=TRYON_MODEL,
+            src=batch_requests,
+            config=types.CreateBatchJobConfig(display_name=inputs.result_name_prefix),
+        )
+        logger.info("📤 Submitted batch job %s (%s views)", job.name, len(batch_requests))
+        job_info["name"] = job.name
+    return job_info
+
+
+async def _wait_for_batch_job(name: str):
+    """Poll a batch job with exponential backoff until it finishes or BATCH_MODE_MAX_WAIT passes."""
+    client = get_genai_client()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + BATCH_MODE_MAX_WAIT
+    delay = 5.0
+    while True:
+        job = await client.aio.batches.get(name=name)
+        remaining = deadline - loop.time()
+        if job.state.name in _BATCH_DONE_STATES or remaining <= 0:
+            return job
+        logger.info("⏳ Batch job %s is %s; checking again in %.0fs", name, job.state.name, delay)
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, 60.0)
+
+
+async def _batch_mode_tryon(tool_context: ToolContext, pending: list, inputs: BatchMultiviewTryOnInput):
+    """
+    Run the batch try-on through Gemini Batch Mode.
+    
+    Resumes the job left in state by an earlier call for the same request
+    (garment, result name and views). A job for a different request is
+    cancelled and a new one submitted. Cached views are not submitted.
+    Finished images go through the same save and cache path as virtual_tryon.
+    
+    Returns:
+        (views, outcomes) in the shape batch_multiview_tryon reports, or None
+        if the job is still running (it stays in state for the next call)
+    """
+    state = tool_context.state
+    job_info = state.get(PENDING_BATCH_JOB_KEY)
+    if job_info and (
+        job_info["garment"] != inputs.garment_image_filename
+        or job_info["result_name"] != inputs.result_name_prefix
+        or [(view["view"], view["person_image"]) for view in job_info["views"]] != pending
+    ):
+        # Don't leave the old job running (and billed) with nothing to collect it
+        logger.info("🛑 Cancelling batch job %s for a different request", job_info["name"])
+        try:
+            await get_genai_client().aio.batches.cancel(name=job_info["name"])
+        except Exception as e:
+            logger.warning("Could not cancel batch job %s: %s", job_info["name"], e)
+        state[PENDING_BATCH_JOB_KEY] = None
+        job_info = None
+    if not job_info:
+        job_info = await _submit_batch_job(tool_context, pending, inputs)
+        if job_info["name"] is not None:
+            state[PENDING_BATCH_JOB_KEY] = job_info
+    
+    responses = iter(())
+    if job_info["name"] is not None:
+        job = await _wait_for_batch_job(job_info["name"])
+        if job.state.name not in _BATCH_DONE_STATES:
+            return None
+        state[PENDING_BATCH_JOB_KEY] = None
+        if job.state.name != "JOB_STATE_SUCCEEDED":
+            raise RuntimeError(f"Batch job {job.name} ended as {job.state.name}")
+        responses = iter(job.dest.inlined_responses)
+    
+    views = []
+    outcomes = []
+    for view in job_info["views"]:
+        views.append((view["view"], view["person_image"]))
+        if view["error"]:
+            outcomes.append(TryOnResult.failed(view["error"]))
+            continue
+        if view["cached"]:
+            outcomes.append(TryOnResult.reused(*view["cached"]))
+            continue
+        inlined = next(responses, None)
+        if inlined is None:
+            outcomes.append(TryOnResult.failed("❌ Batch job returned no response for this view."))
+            continue
+        if inlined.error:
+            outcomes.append(RuntimeError(inlined.error.message or "batch request failed"))
+            continue
+        image_part = None
+        response = inlined.response
+        if response and response.candidates and response.candidates[0].content:
+            for part in response.candidates[0].content.parts:
+                if part.inline_data and part.inline_data.data:
+                    image_part = part
+                    break
+        if image_part is None:
+            outcomes.append(TryOnResult.failed("❌ No image was generated."))
+            continue
+        filename, version = await save_tryon_result(tool_context, job_info["result_name"], image_part)
+        record_tryon_cache(tool_context, view["cache_key"], filename, version)
+        persist_result(tool_context, view["cache_key"], image_part)
+        outcomes.append(TryOnResult.saved(filename, version))
+    return views, outcomes
+
+
 async def batch_multiview_tryon(
     tool_context: ToolContext,
     garment_image_filename: str,
@@ -560,10 +1205,10 @@ async def batch_multiview_tryon(
     Returns:
         Status message with all 3 try-on results
     """
-    if "GEMINI_API_KEY" not in os.environ:
+    if not GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEY environment variable not set.")
     
-    logger.info(f"🎨 Starting batch multiview try-on with garment: {garment_image_filename}")
+    logger.info("🎨 Starting batch multiview try-on with garment: %s", garment_image_filename)
     print(f"🎨 Batch multiview try-on starting...")
     
     try:
@@ -573,7 +1218,7 @@ async def batch_multiview_tryon(
         )
         
         # Get the latest multiview set from state
-        multiview_set = tool_context.state.get("latest_multiview_set")
+        multiview_set = tool_context.state.get(LATEST_MULTIVIEW_SET_KEY)
         if not multiview_set:
             return "❌ No multiview images found. Please generate multiview first using generate_multiview_person."
         
@@ -589,47 +1234,98 @@ async def batch_multiview_tryon(
         results = {}
         views = ['front', 'side', 'back']
         
-        for idx, view_name in enumerate(views, 1):
+        # Collect the views that are available
+        pending = []
+        for view_name in views:
             if view_name not in multiview_set:
                 result_lines.append(f"⚠️ {view_name.capitalize()} view not found, skipping...")
                 continue
+            pending.append((view_name, multiview_set[view_name]))
+        
+        if GEMINI_BATCH_MODE:
+            batch = await _batch_mode_tryon(tool_context, pending, inputs)
+            if batch is None:
+                return (
+                    "⏳ Batch job submitted and still running.\n"
+                    "💡 Call batch_multiview_tryon again with the same garment and prefix (on a later turn) to collect the results."
+                )
+            pending, outcomes = batch
+        else:
+            # Load the garment once and each view's person image, concurrently
+            garment_image, *person_images = await asyncio.gather(
+                load_image(tool_context, inputs.garment_image_filename),
+                *(load_image(tool_context, person_image_filename) for _, person_image_filename in pending),
+            )
+            if not garment_image:
+                return f"❌ Error: Could not load garment image '{inputs.garment_image_filename}'."
             
-            person_image_filename = multiview_set[view_name]
-            result_lines.append(f"🔄 Try-on {idx}/3: {view_name.capitalize()} view...")
-            result_lines.append(f"   Person: {person_image_filename}")
-            
-            logger.info(f"Processing {view_name} view: {person_image_filename}")
+            # Validate the shared fields once; per-view copies skip validation
+            base_inputs = VirtualTryOnInput(
+                person_image_filename=pending[0][1] if pending else "",
+                garment_image_filename=inputs.garment_image_filename,
+                result_name=inputs.result_name_prefix,
+                garment_type="auto"
+            )
             
-            # Call virtual_tryon for this view
-            try:
-                tryon_result = await virtual_tryon(
-                    tool_context=tool_context,
-                    person_image_filename=person_image_filename,
-                    garment_image_filename=inputs.garment_image_filename,
-                    result_name=inputs.result_name_prefix,
-                    additional_instructions=f"This is the {view_name} view of the person.",
-                    garment_type="auto"
+            # Settle load failures and cached views first, so only the views
+            # that will call Gemini take rate limit tokens
+            outcomes = [None] * len(pending)
+            requests = []
+            for idx, ((view_name, person_image_filename), person_image) in enumerate(zip(pending, person_images)):
+                if not person_image:
+                    outcomes[idx] = TryOnResult.failed(f"❌ Error: Could not load person image '{person_image_filename}'.")
+                    continue
+                view_inputs = base_inputs.model_copy(update={
+                    "person_image_filename": person_image_filename,
+                    "additional_instructions": f"This is the {view_name} view of the person.",
+                })
+                cache_key = tryon_cache_key(
+                    person_image, garment_image, view_inputs.garment_type,
+                    view_inputs.additional_instructions, view_inputs.result_name
                 )
-                
-                # Extract result filename from the result message
-                if "✅" in tryon_result and ".png" in tryon_result:
-                    # Parse the result filename
-                    import re
-                    match = re.search(r'(tryon_result_v\d+\.png)', tryon_result)
-                    if match:
-                        result_filename = match.group(1)
-                        results[view_name] = result_filename
-                        result_lines.append(f"   ✅ Success: {result_filename}")
-                    else:
-                        result_lines.append(f"   ✅ Success (filename not parsed)")
+                requests.append((idx, view_inputs, person_image, cache_key))
+            
+            reused = await asyncio.gather(
+                *(_reuse_tryon_result(tool_context, view_inputs, cache_key) for _, view_inputs, _, cache_key in requests),
+                return_exceptions=True
+            )
+            misses = []
+            for request, result in zip(requests, reused):
+                if result is None:
+                    misses.append(request)
                 else:
-                    result_lines.append(f"   ⚠️ {tryon_result}")
-                
-                logger.info(f"✅ Completed {view_name} view")
-                
-            except Exception as e:
-                logger.error(f"Error in {view_name} view try-on: {e}")
-                result_lines.append(f"   ❌ Failed: {e}")
+                    outcomes[request[0]] = result
+            
+            if misses:
+                # Reserve one API call per remaining view up front, then run them
+                # concurrently - the batch takes about as long as a single try-on
+                waited = await get_tryon_rate_limiter().reserve_async(len(misses))
+                if waited:
+                    logger.info("⏳ Waited %.1fs for rate limit before batch", waited)
+                logger.info("Processing %s views concurrently", len(misses))
+                generated = await asyncio.gather(
+                    *(
+                        _generate_tryon(tool_context, view_inputs, person_image, garment_image, cache_key, rate_reserved=True)
+                        for _, view_inputs, person_image, cache_key in misses
+                    ),
+                    return_exceptions=True
+                )
+                for (idx, *_), result in zip(misses, generated):
+                    outcomes[idx] = result
+        
+        for idx, ((view_name, person_image_filename), tryon_result) in enumerate(zip(pending, outcomes), 1):
+            result_lines.append(f"🔄 Try-on {idx}/3: {view_name.capitalize()} view...")
+            result_lines.append(f"   Person: {person_image_filename}")
+            
+            if isinstance(tryon_result, BaseException):
+                logger.error("Error in %s view try-on: %s", view_name, tryon_result)
+                result_lines.append(f"   ❌ Failed: {tryon_result}")
+            elif tryon_result.ok:
+                results[view_name] = tryon_result.filename
+                result_lines.append(f"   ✅ Success: {tryon_result.filename}")
+                logger.info("✅ Completed %s view", view_name)
+            else:
+                result_lines.append(f"   ⚠️ {tryon_result.message}")
             
             result_lines.append("")
         
@@ -654,8 +1350,10 @@ async def batch_multiview_tryon(
             result_lines.append("   2. 🔄 Try another garment or upload new person image!")
             
             # Store batch results in state
-            tool_context.state["latest_batch_tryon"] = results
-            tool_context.state["batch_tryon_garment"] = inputs.garment_image_filename
+            state = tool_context.state
+            state[LATEST_BATCH_TRYON_KEY] = results
+            state["batch_tryon_garment"] = inputs.garment_image_filename
+            update_handoff(state, tryon_results=results)
             
         else:
             result_lines.append("")
@@ -711,10 +1409,10 @@ async def generate_multiview_person(
     Returns:
         Status message with all 3 generated image filenames
     """
-    if "GEMINI_API_KEY" not in os.environ:
+    if not GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEY environment variable not set.")
 
-    logger.info(f"🔄 Generating multiview images from: {person_image_filename}")
+    logger.info("🔄 Generating multiview images from: %s", person_image_filename)
     print(f"🔄 Starting multiview generation from {person_image_filename}...")
 
     try:
@@ -724,14 +1422,17 @@ async def generate_multiview_person(
             save_as_prefix=save_as_prefix
         )
         
-        client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
-        
         # Load the original person image
-        logger.info(f"Loading person image: {inputs.person_image_filename}")
+        logger.info("Loading person image: %s", inputs.person_image_filename)
         person_image = await load_image(tool_context, inputs.person_image_filename)
         if not person_image:
             return f"❌ Error: Could not load person image '{inputs.person_image_filename}'."
         
+        client = get_genai_client()
+        rate_limiter = get_tryon_rate_limiter()
+        model = "gemini-2.5-flash-image-preview"
+        config = types.GenerateContentConfig(response_modalities=["IMAGE"])
+        
         result_lines = ["🎨 Multi-View Generation Started"]
         result_lines.append("=" * 60)
         result_lines.append("")
@@ -746,9 +1447,9 @@ async def generate_multiview_person(
             await tool_context.save_artifact(filename=front_filename, artifact=person_image)
             generated_files['front'] = front_filename
             result_lines.append(f"✅ Front view: {front_filename} (original)")
-            logger.info(f"✅ Saved front view: {front_filename}")
+            logger.info("✅ Saved front view: %s", front_filename)
         except Exception as e:
-            logger.error(f"Error saving front view: {e}")
+            logger.error("Error saving front view: %s", e)
             result_lines.append(f"❌ Front view failed: {e}")
         
         # View 2: Side View
@@ -787,44 +1488,27 @@ async def generate_multiview_person(
 - Every detail must be sharp and clear"""
 
         try:
-            # Check rate limit
-            if not rate_limiter.can_make_call():
-                wait_time = rate_limiter.time_until_next_call()
-                logger.info(f"⏳ Rate limit: waiting {wait_time:.1f}s")
-                rate_limiter.wait_if_needed()
-            
+            # Wait for a call token without blocking other requests
+            await rate_limiter.await_if_needed()
             rate_limiter.record_call()
             
-            model = "gemini-2.5-flash-image-preview"
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[person_image, types.Part.from_text(text=side_prompt)],
-                )
-            ]
-            config = types.GenerateContentConfig(response_modalities=["IMAGE"])
-            
             # Generate side view
-            response = client.models.generate_content(
-                model=model, contents=contents, config=config
+            image_part = await _generate_image(
+                client, model, [person_image, types.Part.from_text(text=side_prompt)], config, "Side view"
             )
             
-            if response.candidates and response.candidates[0].content:
-                for part in response.candidates[0].content.parts:
-                    if part.inline_data and part.inline_data.data:
-                        image_part = types.Part(inline_data=part.inline_data)
-                        side_filename = f"{inputs.save_as_prefix}_side_v1.png"
-                        await tool_context.save_artifact(filename=side_filename, artifact=image_part)
-                        generated_files['side'] = side_filename
-                        result_lines.append(f"✅ Side view: {side_filename}")
-                        logger.info(f"✅ Generated side view: {side_filename}")
-                        break
+            if image_part is not None:
+                side_filename = f"{inputs.save_as_prefix}_side_v1.png"
+                await tool_context.save_artifact(filename=side_filename, artifact=image_part)
+                generated_files['side'] = side_filename
+                result_lines.append(f"✅ Side view: {side_filename}")
+                logger.info("✅ Generated side view: %s", side_filename)
             else:
                 result_lines.append(f"⚠️ Side view: No image generated")
                 logger.warning("⚠️ Side view generation returned no image")
                 
         except Exception as e:
-            logger.error(f"Error generating side view: {e}")
+            logger.error("Error generating side view: %s", e)
             result_lines.append(f"❌ Side view failed: {e}")
         
         # View 3: Back View
@@ -864,42 +1548,27 @@ async def generate_multiview_person(
 - Every detail must be sharp, clear, and photorealistic"""
 
         try:
-            # Check rate limit
-            if not rate_limiter.can_make_call():
-                wait_time = rate_limiter.time_until_next_call()
-                logger.info(f"⏳ Rate limit: waiting {wait_time:.1f}s")
-                rate_limiter.wait_if_needed()
-            
+            # Wait for a call token without blocking other requests
+            await rate_limiter.await_if_needed()
             rate_limiter.record_call()
             
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[person_image, types.Part.from_text(text=back_prompt)],
-                )
-            ]
-            
             # Generate back view
-            response = client.models.generate_content(
-                model=model, contents=contents, config=config
+            image_part = await _generate_image(
+                client, model, [person_image, types.Part.from_text(text=back_prompt)], config, "Back view"
             )
             
-            if response.candidates and response.candidates[0].content:
-                for part in response.candidates[0].content.parts:
-                    if part.inline_data and part.inline_data.data:
-                        image_part = types.Part(inline_data=part.inline_data)
-                        back_filename = f"{inputs.save_as_prefix}_back_v1.png"
-                        await tool_context.save_artifact(filename=back_filename, artifact=image_part)
-                        generated_files['back'] = back_filename
-                        result_lines.append(f"✅ Back view: {back_filename}")
-                        logger.info(f"✅ Generated back view: {back_filename}")
-                        break
+            if image_part is not None:
+                back_filename = f"{inputs.save_as_prefix}_back_v1.png"
+                await tool_context.save_artifact(filename=back_filename, artifact=image_part)
+                generated_files['back'] = back_filename
+                result_lines.append(f"✅ Back view: {back_filename}")
+                logger.info("✅ Generated back view: %s", back_filename)
             else:
                 result_lines.append(f"⚠️ Back view: No image generated")
                 logger.warning("⚠️ Back view generation returned no image")
                 
         except Exception as e:
-            logger.error(f"Error generating back view: {e}")
+            logger.error("Error generating back view: %s", e)
             result_lines.append(f"❌ Back view failed: {e}")
         
         # Summary
@@ -925,8 +1594,10 @@ async def generate_multiview_person(
             result_lines.append("   3. 🎨 Try-on the same garment on all 3 views for complete preview!")
             
             # Store multiview info in state
-            tool_context.state["latest_multiview_set"] = generated_files
-            tool_context.state["multiview_source"] = inputs.person_image_filename
+            state = tool_context.state
+            state[LATEST_MULTIVIEW_SET_KEY] = generated_files
+            state["multiview_source"] = inputs.person_image_filename
+            update_handoff(state, multiview_set=generated_files)
             
         else:
             result_lines.append("")
@@ -992,8 +1663,6 @@ async def generate_video_from_results(
     Returns:
         Formatted string with video generation status and download link
     """
-    import time
-    
     result_lines = []
     result_lines.append("=" * 60)
     result_lines.append("🎬 Veo 3.1 Video Generation from Try-On Results")
@@ -1020,7 +1689,7 @@ async def generate_video_from_results(
             return "❌ Aspect ratio must be '16:9' or '9:16'."
         
         # Get batch try-on results from state
-        latest_batch = tool_context.state.get("latest_batch_tryon")
+        latest_batch = tool_context.state.get(LATEST_BATCH_TRYON_KEY)
         if not latest_batch:
             return "❌ No batch try-on results found. Please run batch_multiview_tryon first."
         
@@ -1113,7 +1782,7 @@ async def generate_video_from_results(
         result_lines.append("   🎬 Generating professional fashion showcase video")
         result_lines.append("")
         
-        client = genai.Client(api_key=GOOGLE_API_KEY)
+        client = get_genai_client(GOOGLE_API_KEY)
         
         # Prepare reference images for Veo 3.1 API
         # Using the VideoGenerationReferenceImage format from the official docs
@@ -1159,7 +1828,7 @@ async def generate_video_from_results(
         if output_gcs_uri:
             config_params["output_gcs_uri"] = output_gcs_uri
         
-        operation = client.models.generate_videos(
+        operation = await client.aio.models.generate_videos(
             model="veo-3.1-generate-preview",
             prompt=prompt,
             config=types.GenerateVideosConfig(**config_params),
@@ -1171,16 +1840,17 @@ async def generate_video_from_results(
         
         # Wait for completion (max 5 minutes)
         max_wait_time = 300
-        start_time = time.time()
+        start_time = time.monotonic()
         check_interval = 15  # Check every 15 seconds
         
-        while not operation.done and (time.time() - start_time) < max_wait_time:
-            elapsed = int(time.time() - start_time)
+        while not operation.done and (time.monotonic() - start_time) < max_wait_time:
+            elapsed = int(time.monotonic() - start_time)
             result_lines.append(f"   ⏱️ {elapsed}s elapsed... (max {max_wait_time}s)")
-            time.sleep(check_interval)
-            operation = client.operations.get(operation)
+            # Poll without blocking the event loop
+            await asyncio.sleep(check_interval)
+            operation = await client.aio.operations.get(operation)
         
-        elapsed_time = int(time.time() - start_time)
+        elapsed_time = int(time.monotonic() - start_time)
         
         if operation.done:
             result_lines.append("")